@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # прагмы и проверка соединений SQLite
+        from . import db  # noqa: F401
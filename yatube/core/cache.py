@@ -0,0 +1,229 @@
+# Кэш, общий для всех процессов на машине.
+# LocMemCache живет внутри воркера: у каждого своя копия ленты, и сброс
+# версии в одном воркере не виден остальным. Здесь записи лежат в файле
+# SQLite в режиме WAL: читатели не блокируют друг друга и писателя.
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed_idx ON cache (accessed)',
+)
+# запись моложе этого (в секундах) не трогаем при чтении:
+# для LRU точность не важна, а лишняя запись на каждый get дорога
+TOUCH_INTERVAL = 1
+ALIVE = '(expires IS NULL OR expires > ?)'
+
+
+def _dumps(value):
+    # целые храним как есть, чтобы incr считал прямо в SQL
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кэш в файле SQLite с вытеснением давно не читанных записей (LRU)
+    и атомарными add/incr.
+
+        CACHES = {
+            'default': {
+                'BACKEND': 'core.cache.SQLiteCache',
+                'LOCATION': '/var/tmp/yatube_cache.sqlite3',
+                'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_EVERY': 100},
+            }
+        }
+
+    Подсчет записей дорог, поэтому лишние вытесняются не на каждой
+    записи, а на каждой CULL_EVERY-й записи процесса.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._cull_every = params.get('OPTIONS', {}).get('CULL_EVERY', 100)
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        # свое соединение на поток; после fork соединение родителя не годится
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection, local.pid = connection, os.getpid()
+            local.writes = 0
+        return local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _write(self, statements):
+        # несколько команд одной транзакцией; IMMEDIATE сразу берет
+        # блокировку записи, чтобы не упасть на середине с SQLITE_BUSY
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def _cull(self, connection, now):
+        self._local.writes += 1
+        if self._local.writes % self._cull_every:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (now,))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (count // self._cull_frequency,)
+        )
+
+    def _set_many(self, rows, timeout, only_missing=False):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = [(key, _dumps(value), expires, now) for key, value in rows]
+        if only_missing:
+            # ключ занят только живой записью: протухшую можно перезаписать
+            query = (
+                'INSERT INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT (key) DO UPDATE SET'
+                ' value = excluded.value, expires = excluded.expires,'
+                ' accessed = excluded.accessed'
+                ' WHERE cache.expires IS NOT NULL AND cache.expires <= ?'
+            )
+            rows = [row + (now,) for row in rows]
+        else:
+            query = 'REPLACE INTO cache (key, value, expires, accessed)' \
+                ' VALUES (?, ?, ?, ?)'
+
+        def statements(connection):
+            changed = connection.executemany(query, rows).rowcount
+            self._cull(connection, now)
+            return changed
+        return self._write(statements)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._set_many(
+            [(self._key(key, version), value)], timeout, only_missing=True
+        ) == 1
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set_many([(self._key(key, version), value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set_many(
+            [(self._key(key, version), value) for key, value in data.items()],
+            timeout
+        )
+        return []
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        rows = self._connection.execute(
+            'SELECT key, value, accessed FROM cache'
+            f' WHERE key IN ({", ".join("?" * len(keys))}) AND {ALIVE}',
+            (*keys, now)
+        ).fetchall()
+        stale = [key for key, value, accessed in rows
+                 if accessed < now - TOUCH_INTERVAL]
+        if stale:
+            self._connection.execute(
+                'UPDATE cache SET accessed = ?'
+                f' WHERE key IN ({", ".join("?" * len(stale))})',
+                (now, *stale)
+            )
+        return {keys[key]: _loads(value) for key, value, accessed in rows}
+
+    def get(self, key, default=None, version=None):
+        found = self.get_many([key], version=version)
+        return found.get(key, default)
+
+    def has_key(self, key, version=None):
+        return self._connection.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time())
+        ).fetchone() is not None
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._connection.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time())
+        ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+
+        def statements(connection):
+            # сложение внутри UPDATE: параллельные incr не теряются
+            updated = connection.execute(
+                'UPDATE cache SET value = value + ?'
+                " WHERE key = ? AND typeof(value) = 'integer'"
+                f' AND {ALIVE}',
+                (delta, key, time.time())
+            ).rowcount
+            if not updated:
+                raise ValueError(f"Key '{key}' not found")
+            return connection.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()[0]
+        return self._write(statements)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._connection.execute(
+                'DELETE FROM cache'
+                f' WHERE key IN ({", ".join("?" * len(keys))})',
+                keys
+            )
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # соединение держим открытым между запросами, как CONN_MAX_AGE
+        pass
@@ -0,0 +1,67 @@
+# Профиль SQLite для продакшена.
+# Каждое новое соединение получает прагмы из settings.SQLITE_PRAGMAS:
+# WAL (читатели не ждут писателя), synchronous=NORMAL (fsync только на
+# контрольных точках WAL), mmap и кэш страниц побольше и busy_timeout,
+# чтобы одновременные записи ждали друг друга, а не падали с
+# «database is locked». Соединения живут между запросами (CONN_MAX_AGE),
+# поэтому перед каждым запросом открытое соединение проверяется.
+import os
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def configure(raw_connection, pragmas=None):
+    """Применяет прагмы к соединению sqlite3."""
+    if pragmas is None:
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    for name, value in pragmas.items():
+        raw_connection.execute(f'PRAGMA {name} = {value}')
+
+
+def _file_id(connection):
+    # файл базы в памяти или еще не создан - сверять нечего
+    try:
+        stat = os.stat(connection.settings_dict['NAME'])
+    except (OSError, TypeError, ValueError):
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def is_healthy(connection):
+    """
+    Годится ли открытое соединение для следующего запроса: файл базы
+    тот же (не подменен восстановлением из копии) и база отвечает.
+    """
+    if getattr(connection, 'file_id', None) != _file_id(connection):
+        return False
+    try:
+        # мимо обертки Django: проверка не попадает в счетчики запросов
+        connection.connection.execute('SELECT 1').fetchone()
+    except connection.Database.Error:
+        return False
+    return True
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    configure(connection.connection)
+    connection.file_id = _file_id(connection)
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    # Django 2.2 не проверяет долгоживущие соединения SQLite
+    # (CONN_HEALTH_CHECKS появился позже) - делаем это сами
+    for connection in connections.all():
+        if connection.vendor != 'sqlite' or connection.connection is None:
+            continue
+        if connection.in_atomic_block:
+            continue
+        if not is_healthy(connection):
+            connection.close()
@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+# фрагмент ленты - несколько килобайт HTML
+VALUE = 'x' * 4096
+
+
+def make_cache(name, directory, max_entries):
+    location = {
+        'locmem': 'benchmark',
+        'filebased': os.path.join(directory, 'filebased'),
+        'sqlite': os.path.join(directory, 'cache.sqlite3'),
+    }[name]
+    return import_string(BACKENDS[name])(
+        location, {'OPTIONS': {'MAX_ENTRIES': max_entries}})
+
+
+def run_mix(cache, operations, keys):
+    # смесь как у ленты: на одну запись девять чтений
+    for number in range(operations):
+        key = f'key:{number % keys}'
+        if number % 10 == 0:
+            cache.set(key, VALUE)
+        else:
+            cache.get(key)
+
+
+def worker(name, directory, max_entries, operations, keys):
+    run_mix(make_cache(name, directory, max_entries), operations, keys)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость бэкендов кэша: LocMem, FileBased и SQLite'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=500)
+        parser.add_argument('--processes', type=int, default=4)
+
+    def timed(self, title, operations, func):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'  {title:<28}{operations / elapsed:>12.0f} оп/с')
+
+    def handle(self, *args, **options):
+        operations, keys = options['operations'], options['keys']
+        processes = options['processes']
+        for name in BACKENDS:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            with tempfile.TemporaryDirectory() as directory:
+                cache = make_cache(name, directory, keys * 2)
+                self.timed('set', operations, lambda: [
+                    cache.set(f'key:{n % keys}', VALUE)
+                    for n in range(operations)])
+                self.timed('get', operations, lambda: [
+                    cache.get(f'key:{n % keys}')
+                    for n in range(operations)])
+                cache.set('counter', 0)
+                self.timed('incr', operations, lambda: [
+                    cache.incr('counter') for n in range(operations)])
+
+                def parallel():
+                    workers = [
+                        multiprocessing.Process(target=worker, args=(
+                            name, directory, keys * 2, operations, keys))
+                        for _ in range(processes)
+                    ]
+                    for process in workers:
+                        process.start()
+                    for process in workers:
+                        process.join()
+                # у LocMem каждый процесс пишет в свою копию кэша
+                self.timed(f'get/set x{processes} процесса',
+                           operations * processes, parallel)
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import configure
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT NOT NULL,'
+    ' pub_date REAL NOT NULL, author_id INTEGER NOT NULL)',
+    'CREATE INDEX post_date_idx ON post (pub_date DESC, id DESC)',
+)
+TEXT = 'Пост для проверки одновременной записи. ' * 10
+
+
+def connect(path, profile):
+    # «как есть» - параметры Django по умолчанию: журнал отката и
+    # ожидание блокировки 5 секунд в самом модуле sqlite3
+    connection = sqlite3.connect(path, isolation_level=None)
+    if profile:
+        configure(connection, settings.SQLITE_PRAGMAS)
+    return connection
+
+
+def seed(path, posts):
+    connection = sqlite3.connect(path)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    now = time.time()
+    with connection:
+        connection.executemany(
+            'INSERT INTO post (text, pub_date, author_id) VALUES (?, ?, ?)',
+            ((TEXT, now - number, number % 100) for number in range(posts)))
+    connection.close()
+
+
+def reader(path, profile, deadline, results):
+    # страница ленты: десять постов по индексу даты
+    connection, rng = connect(path, profile), random.Random(os.getpid())
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            connection.execute(
+                'SELECT id, text, author_id FROM post WHERE pub_date < ?'
+                ' ORDER BY pub_date DESC, id DESC LIMIT 10',
+                (time.time() - rng.random() * 1000,)).fetchall()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put(('read', latencies, errors))
+
+
+def writer(path, profile, deadline, results):
+    # как post_create: новый пост в своей транзакции
+    connection = connect(path, profile)
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute(
+                    'INSERT INTO post (text, pub_date, author_id)'
+                    ' VALUES (?, ?, ?)', (TEXT, time.time(), os.getpid()))
+        except sqlite3.OperationalError:
+            # database is locked
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put(('write', latencies, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Смешанная нагрузка на SQLite из нескольких процессов: базовые '
+        'настройки против профиля SQLITE_PRAGMAS. Пишет во временный файл.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=10000)
+
+    def run(self, path, profile, options):
+        results = multiprocessing.Queue()
+        deadline = time.time() + options['seconds']
+        workers = [
+            multiprocessing.Process(
+                target=reader, args=(path, profile, deadline, results))
+            for _ in range(options['readers'])
+        ] + [
+            multiprocessing.Process(
+                target=writer, args=(path, profile, deadline, results))
+            for _ in range(options['writers'])
+        ]
+        for process in workers:
+            process.start()
+        collected = {'read': ([], 0), 'write': ([], 0)}
+        for _ in workers:
+            kind, latencies, errors = results.get()
+            done, failed = collected[kind]
+            collected[kind] = (done + latencies, failed + errors)
+        for process in workers:
+            process.join()
+        return collected
+
+    def report(self, title, latencies, errors, seconds):
+        # по ближайшему рангу: statistics.quantiles нет в Python 3.7
+        ordered = sorted(latencies)
+        p99 = (
+            ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000
+            if ordered else 0
+        )
+        self.stdout.write(
+            f'  {title:<8}{len(latencies) / seconds:>10.0f} оп/с'
+            f'{p99:>10.1f} мс p99{errors:>8} ошибок')
+
+    def handle(self, *args, **options):
+        for title, profile in (('как есть', False), ('профиль', True)):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                seed(path, options['posts'])
+                if profile:
+                    # WAL запоминается в файле базы
+                    configure(sqlite3.connect(path), settings.SQLITE_PRAGMAS)
+                collected = self.run(path, profile, options)
+                for kind, label in (('read', 'чтение'), ('write', 'запись')):
+                    self.report(label, *collected[kind], options['seconds'])
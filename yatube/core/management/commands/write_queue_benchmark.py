@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from core.writes import WriteQueue, p99
+
+ALIAS = 'write_queue_benchmark'
+SCHEMA = (
+    'CREATE TABLE follow (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL,'
+    ' author_id INTEGER NOT NULL, UNIQUE (user_id, author_id))',
+)
+
+
+def follow(user_id, author_id):
+    # как profile_follow: проверка, потом запись
+    with connections[ALIAS].cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM follow WHERE user_id = %s AND author_id = %s',
+            [user_id, author_id])
+        if cursor.fetchone() is None:
+            cursor.execute(
+                'INSERT INTO follow (user_id, author_id) VALUES (%s, %s)',
+                [user_id, author_id])
+
+
+def direct(func, *args):
+    # каждый поток пишет сам, как сейчас во views
+    with transaction.atomic(using=ALIAS):
+        func(*args)
+
+
+class Command(BaseCommand):
+    help = (
+        'Одновременная запись из нескольких потоков во временный файл '
+        'SQLite: каждый поток сам против очереди записи core/writes.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--writes', type=int, default=200,
+                            help='Записей на поток')
+
+    def worker(self, submit, number, options, results):
+        latencies, errors = [], 0
+        for step in range(options['writes']):
+            started = time.perf_counter()
+            try:
+                submit(follow, number, step)
+            except OperationalError:
+                # database is locked
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+        connections[ALIAS].close()
+        results.append((latencies, errors))
+
+    def run(self, submit, options):
+        results = []
+        threads = [
+            threading.Thread(
+                target=self.worker, args=(submit, number, options, results))
+            for number in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+        latencies = [value for done, _ in results for value in done]
+        errors = sum(failed for _, failed in results)
+        return latencies, errors, seconds
+
+    def report(self, title, latencies, errors, seconds, extra=''):
+        self.stdout.write(
+            f'  {title:<10}{len(latencies) / seconds:>10.0f} записей/с'
+            f'{p99(latencies) * 1000:>10.1f} мс p99{errors:>8} ошибок{extra}')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            for title in ('сам', 'очередь'):
+                connections.databases[ALIAS] = {
+                    **connections['default'].settings_dict,
+                    'NAME': os.path.join(directory, f'{title}.sqlite3'),
+                }
+                with connections[ALIAS].cursor() as cursor:
+                    for statement in SCHEMA:
+                        cursor.execute(statement)
+                if title == 'сам':
+                    self.report(title, *self.run(direct, options))
+                else:
+                    write_queue = WriteQueue(ALIAS)
+                    result = self.run(write_queue.submit, options)
+                    write_queue.stop()
+                    stats = write_queue.stats()
+                    self.report(
+                        title, *result,
+                        f', в пачке {stats["batch"]:.1f}, '
+                        f'повторов {stats["retries"]}')
+                connections[ALIAS].close()
+                del connections[ALIAS]
+        del connections.databases[ALIAS]
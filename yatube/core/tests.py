@@ -0,0 +1,248 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.db import IntegrityError, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, override_settings
+
+from core import db, writes
+from core.cache import SQLiteCache
+
+
+def open_cache(directory, **options):
+    return SQLiteCache(
+        os.path.join(directory, 'cache.sqlite3'), {'OPTIONS': options})
+
+
+def incr_many(directory, times):
+    cache = open_cache(directory)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+def try_add(directory, results):
+    results.put(open_cache(directory).add('winner', os.getpid()))
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = open_cache(self.directory)
+
+    def test_basic_operations(self):
+        """Кэш ведет себя как обычный бэкенд Django."""
+        self.cache.set('key', {'a': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'a': [1, 2]})
+        self.assertTrue(self.cache.has_key('key'))
+        self.cache.set_many({'one': 1, 'two': 'two'})
+        self.assertEqual(
+            self.cache.get_many(['one', 'two', 'missing']),
+            {'one': 1, 'two': 'two'}
+        )
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.clear()
+        self.assertEqual(self.cache.get('one', 'default'), 'default')
+
+    def test_add_and_expiry(self):
+        """add не перезаписывает живую запись, но занимает протухшую."""
+        self.assertTrue(self.cache.add('key', 'first', 0.1))
+        self.assertFalse(self.cache.add('key', 'second'))
+        time.sleep(0.2)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'third'))
+        self.assertEqual(self.cache.get('key'), 'third')
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные записи."""
+        cache = open_cache(
+            self.directory, MAX_ENTRIES=4, CULL_FREQUENCY=2, CULL_EVERY=1)
+        for number in range(4):
+            cache.set(f'key:{number}', number)
+        cache._connection.execute('UPDATE cache SET accessed = 0')
+        # последние прочитанные записи переживают вытеснение
+        cache.get_many(['key:0', 'key:1'])
+        cache.set('key:4', 4)
+        self.assertEqual(
+            sorted(cache.get_many([f'key:{n}' for n in range(5)])),
+            ['key:0', 'key:1', 'key:4']
+        )
+
+    def test_processes_share_cache(self):
+        """Несколько процессов видят одни и те же записи и счетчики."""
+        context = multiprocessing.get_context('fork')
+        self.cache.set('counter', 0)
+        processes = [
+            context.Process(target=incr_many, args=(self.directory, 200))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+
+        results = context.Queue()
+        processes = [
+            context.Process(target=try_add, args=(self.directory, results))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        added = [results.get() for _ in processes]
+        self.assertEqual(added.count(True), 1)
+        # запись победителя видна и в этом процессе
+        self.assertIn(
+            self.cache.get('winner'), [process.pid for process in processes])
+
+
+class SQLiteProfileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'db.sqlite3')
+        self.connection = DatabaseWrapper(
+            {**connections['default'].settings_dict, 'NAME': self.path},
+            alias='profile')
+        self.connection.ensure_connection()
+        self.addCleanup(self.connection.close)
+
+    def pragma(self, name):
+        return self.connection.connection.execute(
+            f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        # NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_replaced_file_is_unhealthy(self):
+        """Файл базы подменили восстановлением из копии - переподключаемся."""
+        self.assertTrue(db.is_healthy(self.connection))
+        replacement = self.path + '.restored'
+        sqlite3.connect(replacement).close()
+        os.replace(replacement, self.path)
+        self.assertFalse(db.is_healthy(self.connection))
+
+
+class WriteQueueTests(SimpleTestCase):
+    alias = 'writes'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'db.sqlite3')
+        connections.databases[self.alias] = {
+            **connections['default'].settings_dict, 'NAME': self.path}
+        self.addCleanup(self.forget_alias)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE note (id INTEGER PRIMARY KEY, text TEXT UNIQUE)')
+
+    def forget_alias(self):
+        connections[self.alias].close()
+        del connections[self.alias]
+        del connections.databases[self.alias]
+
+    def start(self, **options):
+        write_queue = writes.WriteQueue(self.alias, **options)
+        self.addCleanup(write_queue.stop)
+        return write_queue
+
+    def insert(self, text):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('INSERT INTO note (text) VALUES (%s)', [text])
+            return cursor.lastrowid
+
+    def notes(self):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT text FROM note ORDER BY text')
+            return [text for text, in cursor.fetchall()]
+
+    def submit_all(self, write_queue, texts, func=None):
+        # одновременно из нескольких потоков: {текст: результат или ошибка}
+        results = {}
+
+        def submit(text):
+            try:
+                results[text] = write_queue.submit(func or self.insert, text)
+            except Exception as error:
+                results[text] = error
+        threads = [
+            threading.Thread(target=submit, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_writes_batched(self):
+        """Одновременные записи коммитятся общими пачками."""
+        write_queue = self.start(WINDOW=0.05)
+        texts = [f'note {number:02}' for number in range(20)]
+        results = self.submit_all(write_queue, texts)
+        self.assertEqual(sorted(results.values()), list(range(1, 21)))
+        self.assertEqual(self.notes(), texts)
+        stats = write_queue.stats()
+        self.assertEqual(stats['writes'], 20)
+        self.assertLess(stats['batches'], 20)
+        self.assertGreater(stats['throughput'], 0)
+        self.assertGreater(stats['p99'], 0)
+
+    def test_failed_write_rolls_back_alone(self):
+        """Ошибка одной записи пачки достается только ее запросу."""
+        write_queue = self.start(WINDOW=0.2, MAX_BATCH=2)
+        write_queue.submit(self.insert, 'taken')
+        results = self.submit_all(write_queue, ['taken', 'free'])
+        self.assertIsInstance(results['taken'], IntegrityError)
+        self.assertEqual(results['free'], 2)
+        self.assertEqual(self.notes(), ['free', 'taken'])
+        self.assertEqual(write_queue.stats()['failed'], 1)
+
+    def test_failed_commit_hook_is_not_write_error(self):
+        """Упавший on_commit не портит ответ записям пачки и их хуки."""
+        write_queue = self.start(WINDOW=0.2, MAX_BATCH=2)
+        done = []
+
+        def insert_with_hook(text):
+            if text == 'broken':
+                transaction.on_commit(lambda: 1 / 0, using=self.alias)
+            transaction.on_commit(
+                lambda: done.append(text), using=self.alias)
+            return self.insert(text)
+        with self.assertLogs('core.writes', 'ERROR'):
+            results = self.submit_all(
+                write_queue, ['broken', 'fine'], insert_with_hook)
+        self.assertEqual(sorted(results.values()), [1, 2])
+        self.assertEqual(sorted(done), ['broken', 'fine'])
+        self.assertEqual(write_queue.stats()['failed'], 0)
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 0})
+    def test_busy_database_retried(self):
+        """Пока базу держит другой процесс, пачка повторяется."""
+        other = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False)
+        self.addCleanup(other.close)
+        other.execute('BEGIN IMMEDIATE')
+        threading.Timer(0.05, other.execute, ['COMMIT']).start()
+        write_queue = self.start(RETRIES=20, BACKOFF=0.01, BACKOFF_MAX=0.05)
+        self.assertEqual(write_queue.submit(self.insert, 'late'), 1)
+        self.assertGreater(write_queue.stats()['retries'], 0)
+        self.assertEqual(self.notes(), ['late'])
@@ -0,0 +1,263 @@
+# Очередь записи в SQLite.
+# У SQLite один писатель на всю базу: одновременные публикации,
+# комментарии, подписки и регистрации в потоках одного процесса спорят
+# за блокировку записи. Здесь все записи процесса выполняет один поток
+# через одно соединение. Записи, пришедшие в пределах WINDOW друг от
+# друга, идут одной транзакцией (BEGIN IMMEDIATE - блокировка берется
+# сразу, а не посреди записи), каждая - в своей точке сохранения, так что
+# ошибка одной записи откатывает только ее. Если база занята другим
+# процессом (SQLITE_BUSY), пачка повторяется после паузы со случайным
+# разбросом. Запрос ждет коммита своей пачки и получает свой результат
+# или свое исключение.
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+)
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def is_busy(error):
+    """База занята другим писателем - ошибка не самой записи."""
+    message = str(error)
+    return isinstance(error, OperationalError) and (
+        'locked' in message or 'busy' in message)
+
+
+def p99(values):
+    """99-й процентиль по ближайшему рангу (statistics.quantiles - с 3.8)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+class Job:
+    __slots__ = ('func', 'args', 'kwargs', 'submitted', 'done', 'result',
+                 'error')
+
+    def __init__(self, func, args, kwargs):
+        self.func, self.args, self.kwargs = func, args, kwargs
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = self.error = None
+
+
+class WriteQueue:
+    """Поток записи для базы `using`; настройки - из settings.WRITE_QUEUE."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, **options):
+        options = {**settings.WRITE_QUEUE, **options}
+        self.using = using
+        self.window = options['WINDOW']
+        self.max_batch = options['MAX_BATCH']
+        self.retries = options['RETRIES']
+        self.backoff = options['BACKOFF']
+        self.backoff_max = options['BACKOFF_MAX']
+        self.report_every = options['REPORT_EVERY']
+        self.reported = time.monotonic()
+        self.jobs = queue.SimpleQueue()
+        # (время коммита, задержка) последних записей
+        self.samples = deque(maxlen=options['SAMPLES'])
+        self.counters = dict.fromkeys(
+            ('writes', 'batches', 'retries', 'failed'), 0)
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(
+            target=self.loop, name=f'write-queue-{using}', daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """Выполняет `func` в потоке записи и ждет коммита."""
+        job = Job(func, args, kwargs)
+        self.jobs.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def stop(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+    def collect(self):
+        # первая запись ждется сколько угодно, остальные - до конца окна
+        batch = [self.jobs.get()]
+        deadline = time.perf_counter() + self.window
+        while batch[-1] is not None and len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.jobs.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def loop(self):
+        while True:
+            batch = self.collect()
+            stopping = batch[-1] is None
+            batch = [job for job in batch if job is not None]
+            if batch:
+                try:
+                    self.prepare()
+                    self.run(batch)
+                except Exception as error:
+                    # пачка не закоммичена - ошибка у каждого запроса
+                    for job in batch:
+                        job.result, job.error = None, error
+                self.finish(batch)
+            if stopping:
+                connections[self.using].close()
+                return
+
+    def prepare(self):
+        # у потока записи нет запросов, и соединение перед пачкой
+        # проверяется так же, как в core/db.py перед запросом
+        connection = connections[self.using]
+        if connection.connection is not None and not db.is_healthy(
+                connection):
+            connection.close()
+        connection.close_if_unusable_or_obsolete()
+
+    def run(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                self.commit(batch)
+                return
+            except OperationalError as error:
+                if not is_busy(error) or attempt == self.retries:
+                    raise
+            # откат вернул базу к началу пачки; повторный save() модели,
+            # получившей pk, вставит ту же строку заново
+            with self.lock:
+                self.counters['retries'] += 1
+            time.sleep(random.uniform(
+                0, min(self.backoff_max, self.backoff * 2 ** attempt)))
+
+    def commit(self, batch):
+        # atomic() начинает транзакцию отложенным BEGIN, и блокировка
+        # записи бралась бы посреди пачки, после чтений. Транзакция
+        # открывается вручную, atomic() внутри нее - точки сохранения
+        connection = connections[self.using]
+        connection.set_autocommit(False)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('BEGIN IMMEDIATE')
+            for job in batch:
+                self.apply(job)
+            connection.commit()
+            # on_commit выполняются ниже, а не при возврате автокоммита:
+            # там первая же ошибка пропустила бы остальные хуки
+            hooks, connection.run_on_commit = connection.run_on_commit, []
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            connection.set_autocommit(True)
+        for _, hook in hooks:
+            # пачка уже закоммичена: ошибка хука не ошибка записи
+            try:
+                hook()
+            except Exception:
+                logger.exception('Ошибка on_commit после записи')
+
+    def apply(self, job):
+        try:
+            with transaction.atomic(using=self.using):
+                job.result = job.func(*job.args, **job.kwargs)
+            job.error = None
+        except Exception as error:
+            if is_busy(error):
+                raise
+            job.result, job.error = None, error
+
+    def finish(self, batch):
+        now = time.perf_counter()
+        with self.lock:
+            self.counters['batches'] += 1
+            self.counters['writes'] += len(batch)
+            self.counters['failed'] += sum(
+                job.error is not None for job in batch)
+            self.samples.extend((now, now - job.submitted) for job in batch)
+        for job in batch:
+            job.done.set()
+        if time.monotonic() - self.reported >= self.report_every:
+            self.reported = time.monotonic()
+            logger.info(
+                'Очередь записи: %(throughput).0f записей/с, '
+                'p99 %(p99).1f мс, в пачке %(batch).1f, '
+                'повторов %(retries)d, ошибок %(failed)d', self.stats())
+
+    def stats(self):
+        """
+        Счетчики с запуска и по последним SAMPLES записям: пропускная
+        способность (записей/с) и 99-й процентиль задержки (мс).
+        """
+        with self.lock:
+            samples = list(self.samples)
+            counters = dict(self.counters)
+        span = (
+            samples[-1][0] - min(done - latency for done, latency in samples)
+            if samples else 0
+        )
+        return {
+            **counters,
+            'throughput': len(samples) / span if span else 0,
+            'p99': p99([latency for _, latency in samples]) * 1000,
+            'batch': (
+                counters['writes'] / counters['batches']
+                if counters['batches'] else 0
+            ),
+        }
+
+
+def get_queue(using=DEFAULT_DB_ALIAS):
+    # поток записи свой у каждого процесса: после fork его нет
+    key = (os.getpid(), using)
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = WriteQueue(using)
+        return _queues[key]
+
+
+def enabled(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    return (
+        settings.WRITE_QUEUE['ENABLED']
+        and connection.vendor == 'sqlite'
+        # запись внутри уже открытой транзакции остается в ней
+        and not connection.in_atomic_block
+        # у базы в памяти (тесты) блокировки таблиц, а не файла
+        and not connection.is_in_memory_db()
+    )
+
+
+def write(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Выполняет запись `func(*args, **kwargs)` в транзакции - через очередь
+    записи, если она включена, - и возвращает ее результат.
+    """
+    if not enabled(using):
+        with transaction.atomic(using=using):
+            return func(*args, **kwargs)
+    return get_queue(using).submit(func, *args, **kwargs)
+
+
+def stats(using=DEFAULT_DB_ALIAS):
+    """Метрики очереди записи этого процесса; None, если записей не было."""
+    write_queue = _queues.get((os.getpid(), using))
+    return write_queue.stats() if write_queue else None
@@ -1,5 +1,7 @@
 from django.contrib import admin
 from .models import Post, Group, Comment, Follow
+from .compression import body
+from .search import filter_queryset
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -18,11 +20,22 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по полнотекстовому индексу вместо LIKE '%...%'
+        return filter_queryset(queryset, search_term), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('post', 'author', 'text', 'created')
     list_filter = ('created',)
-    search_fields = ('author', 'post', 'text')
+    search_fields = ('text',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # длинные комментарии хранятся сжатыми, столбец text у них пуст
+        if not search_term:
+            return queryset, False
+        return queryset.annotate(body=body()).filter(
+            body__icontains=search_term), False
 
 # При регистрации модели Post источником конфигурации для неё назначаем
 # класс PostAdmin
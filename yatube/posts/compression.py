@@ -0,0 +1,179 @@
+# Сжатие длинных текстов постов и комментариев.
+# Текст длиннее TEXT_COMPRESS_MIN байт хранится в столбце text_z сжатым
+# zlib со словарем, обученным на наших же текстах, а столбец text тогда
+# пуст. Модель распаковывает текст только при обращении к нему, см.
+# CompressedTextMixin в posts/models.py. Для SQL (полнотекстовый индекс,
+# LIKE) в каждое соединение SQLite добавляется функция posts_text(text,
+# text_z) - она возвращает текст, где бы он ни лежал.
+import struct
+import sys
+import zlib
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F, Func, TextField
+from django.dispatch import receiver
+
+from . import constants
+
+SQL_FUNCTION = 'posts_text'
+# заголовок сжатого текста - номер словаря, 0 - без словаря
+HEADER = struct.Struct('>H')
+WBITS = -zlib.MAX_WBITS
+
+_dictionaries = {0: b''}
+# deterministic у create_function появился в Python 3.8
+FUNCTION_OPTIONS = (
+    {'deterministic': True} if sys.version_info >= (3, 8) else {}
+)
+
+
+def dictionary(pk):
+    """Словарь по номеру; словари не меняются, поэтому кэшируются."""
+    if pk not in _dictionaries:
+        from .models import TextDictionary
+        _dictionaries[pk] = bytes(TextDictionary.objects.values_list(
+            'data', flat=True).get(pk=pk))
+    return _dictionaries[pk]
+
+
+def current_dictionary():
+    """(номер, словарь) для новых записей - последний обученный."""
+    from .models import TextDictionary
+    latest = TextDictionary.objects.order_by('-pk').values_list(
+        'pk', 'data').first()
+    if latest is None:
+        return 0, b''
+    _dictionaries[latest[0]] = bytes(latest[1])
+    return latest[0], _dictionaries[latest[0]]
+
+
+def remember(pk, data):
+    """Кладет в кэш процесса словарь, которого нет в базе (бенчмарк)."""
+    _dictionaries[pk] = data
+
+
+def forget():
+    """Сбрасывает словари процесса (после обучения нового и в тестах)."""
+    _dictionaries.clear()
+    _dictionaries[0] = b''
+
+
+def compress(text, current=None):
+    """
+    Сжатый текст или None, если текст короткий или сжатие не окупается.
+    `current` - (номер, словарь), по умолчанию последний обученный.
+    """
+    if connection.vendor != 'sqlite':
+        # остальные СУБД сами сжимают длинные строки (TOAST в PostgreSQL)
+        return None
+    data = text.encode()
+    if len(data) < constants.TEXT_COMPRESS_MIN:
+        return None
+    pk, zdict = current_dictionary() if current is None else current
+    options = {'zdict': zdict} if zdict else {}
+    packer = zlib.compressobj(
+        constants.TEXT_COMPRESS_LEVEL, zlib.DEFLATED, WBITS, **options)
+    packed = HEADER.pack(pk) + packer.compress(data) + packer.flush()
+    return packed if len(packed) < len(data) else None
+
+
+def decompress(packed):
+    packed = bytes(packed)
+    (pk,) = HEADER.unpack_from(packed)
+    zdict = dictionary(pk)
+    options = {'zdict': zdict} if zdict else {}
+    unpacker = zlib.decompressobj(WBITS, **options)
+    data = unpacker.decompress(packed[HEADER.size:]) + unpacker.flush()
+    return data.decode()
+
+
+def unpack(text, packed):
+    """Текст строки по значениям обоих столбцов."""
+    if text or packed is None:
+        return text
+    return decompress(packed)
+
+
+def train(samples, size=None):
+    """
+    Словарь из частых слов и сочетаний слов в `samples`.
+    zlib ищет совпадения и в словаре, ближние к тексту - дешевле,
+    поэтому самые выгодные куски ставятся в конец.
+    """
+    size = constants.TEXT_DICTIONARY_SIZE if size is None else size
+    phrases = Counter()
+    for sample in samples:
+        tokens = sample.split()
+        for length in (1, 2, 3):
+            for start in range(len(tokens) - length + 1):
+                phrases[' '.join(tokens[start:start + length]) + ' '] += 1
+    # выгода куска - сколько байт он сэкономит во всех текстах
+    scored = sorted(
+        (count * len(phrase.encode()), phrase)
+        for phrase, count in phrases.items() if count > 1
+    )
+    chosen, used = [], 0
+    for score, phrase in reversed(scored):
+        encoded = phrase.encode()
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+def convert(model, batch_size, current=None, compressed=True):
+    """
+    Приводит тексты всех строк `model` к текущему порогу и словарю, а с
+    `compressed=False` - распаковывает все. Строки читаются пачками по
+    первичному ключу, каждая пачка пишется в своей транзакции.
+    Возвращает число измененных строк.
+    """
+    if compressed and current is None:
+        current = current_dictionary()
+    last, changed = 0, 0
+    while True:
+        rows = list(
+            model.objects.filter(pk__gt=last).order_by('pk')
+            .values_list('pk', 'text', 'text_z')[:batch_size]
+        )
+        if not rows:
+            return changed
+        last = rows[-1][0]
+        with transaction.atomic():
+            for pk, text, packed in rows:
+                body = unpack(text, packed)
+                fresh = compress(body, current) if compressed else None
+                if fresh is None:
+                    stored = {'text': body, 'text_z': None}
+                else:
+                    stored = {'text': '', 'text_z': fresh}
+                if packed is not None:
+                    packed = bytes(packed)
+                if (stored['text'], stored['text_z']) == (text, packed):
+                    continue
+                model.objects.filter(pk=pk).update(**stored)
+                changed += 1
+
+
+def body():
+    """
+    Выражение для ORM: текст строки, распакованный в SQL. Фильтры по
+    самому `text` сжатых строк не видят - искать надо по нему:
+    annotate(body=body()).filter(body__icontains=...).
+    """
+    if connection.vendor != 'sqlite':
+        return F('text')
+    return Func(F('text'), F('text_z'), function=SQL_FUNCTION,
+                output_field=TextField())
+
+
+@receiver(connection_created)
+def register_function(sender, connection, **kwargs):
+    # триггеры и представление полнотекстового индекса (миграция 0020)
+    # читают текст через эту функцию
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            SQL_FUNCTION, 2, unpack, **FUNCTION_OPTIONS)
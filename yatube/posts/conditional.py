@@ -0,0 +1,100 @@
+# Условные GET-запросы (ETag / Last-Modified) для лент и страницы поста
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.http import Http404
+from django.views.decorators.http import condition
+
+from . import feed_cache, lookups
+from .models import Post
+
+
+def feed_condition(scopes):
+    """
+    Декоратор view: валидаторы считаются по версиям лент `scopes(request,
+    **kwargs)` без обращения к шаблону. Совпавший запрос получает 304.
+    `scopes` возвращает None, если объекта нет - тогда решает сам view.
+    """
+    def validators(request, **kwargs):
+        if not hasattr(request, '_feed_validators'):
+            feed_scopes = scopes(request, **kwargs)
+            request._feed_validators = None
+            if feed_scopes is not None:
+                if request.user.is_authenticated:
+                    # кнопки подписки и шапка зависят от читателя
+                    feed_scopes.append(f'follow:{request.user.pk}')
+                versions = feed_cache.get_versions(*feed_scopes)
+                raw = '|'.join([
+                    request.get_full_path(),
+                    str(request.user.pk),
+                    # в странице форма с CSRF-токеном: вход и выход меняют
+                    # ключ сессии (и токен), старая копия не годится
+                    request.session.session_key or '',
+                    *map(str, versions)
+                ])
+                request._feed_validators = (
+                    hashlib.md5(raw.encode()).hexdigest(),
+                    # версии - время записи в наносекундах
+                    datetime.fromtimestamp(max(versions) / 10 ** 9,
+                                           tz=timezone.utc),
+                )
+        return request._feed_validators
+
+    def etag(request, **kwargs):
+        found = validators(request, **kwargs)
+        return found and found[0]
+
+    def last_modified(request, **kwargs):
+        found = validators(request, **kwargs)
+        return found and found[1]
+
+    def decorator(view):
+        view_with_validators = condition(
+            etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view_with_validators(request, *args, **kwargs)
+            if getattr(request, 'stale_fragment', False):
+                # устаревшая страница не должна запомниться под новым ETag
+                del response['ETag']
+                del response['Last-Modified']
+            return response
+        return wrapper
+
+    return decorator
+
+
+def index_scopes(request):
+    return ['index']
+
+
+def group_scopes(request, slug):
+    try:
+        return [f'group:{lookups.get_group_or_404(slug).pk}']
+    except Http404:
+        return None
+
+
+def profile_scopes(request, username):
+    try:
+        return [f'author:{lookups.get_author_or_404(username).pk}']
+    except Http404:
+        return None
+
+
+def post_scopes(request, post_id):
+    # правка поста и комментарии меняют версию поста, переименование
+    # автора или группы - их версии, а переименование комментатора -
+    # версии постов с его комментариями, см. signals.user_saved
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'group_id').first()
+    if post is None:
+        return None
+    return [f'post:{post_id}'] + feed_cache.post_scopes(
+        post['author_id'], post['group_id'])[1:]
+
+
+def follow_scopes(request):
+    return ['index']
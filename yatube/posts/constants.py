@@ -1,2 +1,82 @@
 # кольво постов
 PUB_VALUE = 10
+# сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL = 100
+# авторы с большим числом подписчиков не раскладываются по лентам,
+# их посты подмешиваются в ленту при чтении
+FANOUT_LIMIT = 1000
+# сколько живет отрисованная карточка поста в кэше
+CARD_CACHE_TTL = 60 * 60 * 24 * 7
+# сколько живет страница для анонимных читателей в кэше
+PAGE_CACHE_TTL = 60 * 60
+# защита от одновременной пересборки кэша, см. posts/single_flight.py:
+# сколько держится блокировка пересчета, сколько ждать чужого пересчета
+# при холодном промахе и как часто проверять, готов ли он
+FLIGHT_LOCK_TTL = 30
+FLIGHT_WAIT = 5
+FLIGHT_POLL = 0.05
+# склонность к раннему пересчету: больше - раньше
+FLIGHT_BETA = 1.0
+# сколько живет адрес миниатюры в кэше
+THUMBNAIL_CACHE_TTL = 60 * 60 * 24
+# кэш групп и авторов по адресу, см. posts/lookups.py: сколько записей
+# держит процесс, сколько живет копия в процессе и в общем кэше
+LOOKUP_LOCAL_SIZE = 1000
+LOOKUP_LOCAL_TTL = 5
+LOOKUP_SHARED_TTL = 60 * 60
+# счетчики попаданий кэша адресов пишутся в лог раз в столько секунд
+LOOKUP_REPORT_EVERY = 60
+# комментариев на странице поста и в каждой догружаемой порции
+COMMENTS_PER_PAGE = 20
+# адаптивные картинки постов: имя -> (ширины, высота / ширина, опции sorl);
+# каждая ширина режется в WebP и в JPEG для браузеров без WebP
+RESPONSIVE_IMAGES = {
+    'card': ((320, 640, 960), 339 / 960, {'crop': 'center', 'upscale': True}),
+}
+IMAGE_FORMATS = ('WEBP', 'JPEG')
+# миниатюры картинок постов: имя -> (геометрия, опции sorl-thumbnail);
+# все они нарезаются заранее, сразу после загрузки картинки
+THUMBNAILS = {
+    f'{name}-{width}-{image_format.lower()}': (
+        f'{width}x{round(width * ratio)}',
+        {**options, 'format': image_format},
+    )
+    for name, (widths, ratio, options) in RESPONSIVE_IMAGES.items()
+    for width in widths
+    for image_format in IMAGE_FORMATS
+}
+# процессов, нарезающих миниатюры в фоне; 0 - резать в текущем процессе
+THUMBNAIL_WORKERS = 2
+# сборщик осиротевших картинок, см. posts/media_gc.py: файлы моложе этого
+# не трогаем - загрузка могла еще не дойти до коммита, а адрес миниатюры -
+# еще жить в кэше; сколько файлов проверять за раз и доля ложных
+# срабатываний фильтра Блума (они только оставляют лишний файл)
+MEDIA_GC_GRACE = 60 * 60 * 24
+MEDIA_GC_BATCH = 500
+MEDIA_GC_ERROR_RATE = 0.001
+# загрузка картинок, см. posts/uploads.py: предельный размер файла,
+# предельное число пикселей (защита от «бомб» - маленьких файлов,
+# распаковывающихся в гигабайты), наибольшая сторона и качество после
+# перекодирования
+UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+UPLOAD_MAX_PIXELS = 50 * 1000 * 1000
+IMAGE_MAX_SIDE = 2048
+IMAGE_QUALITY = 85
+# число постов для нумерованной навигации, см. posts/feed_counts.py:
+# до этого порога лента считается точно (COUNT с LIMIT), дальше -
+# оценивается; оценка живет в кэше столько секунд
+FEED_COUNT_EXACT_LIMIT = 1000
+FEED_COUNT_TTL = 60 * 10
+# номеров страниц по обе стороны от текущей и по краям навигации
+PAGE_WINDOW = 2
+PAGE_ENDS = 1
+# начало текста в карточках лент, см. Post.excerpt: не длиннее стольких
+# символов, полный текст - на странице поста
+EXCERPT_LENGTH = 300
+# сжатие текстов постов и комментариев, см. posts/compression.py:
+# тексты короче стольких байт хранятся как есть, словарь zlib
+# обучается на стольких последних постах и комментариях и весит не больше
+TEXT_COMPRESS_MIN = 1024
+TEXT_COMPRESS_LEVEL = 9
+TEXT_DICTIONARY_SAMPLES = 2000
+TEXT_DICTIONARY_SIZE = 32 * 1024
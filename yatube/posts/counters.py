@@ -0,0 +1,96 @@
+# Денормализованные счетчики постов, комментариев, подписок и ссылок
+# на файлы картинок
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, MediaFile, Post, User
+
+
+def change(model, pk, field, delta):
+    """Атомарно сдвигает счетчик строки через F(), без чтения."""
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        # счетчик не уходит в минус, даже если успел разойтись с данными
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    if not rows.update(**{field: F(field) + delta}) and (
+            model is AuthorStats and delta > 0):
+        # у пользователей из loaddata и bulk_create строки счетчиков нет
+        create_stats(pk)
+
+
+def create_stats(pk):
+    """
+    Заводит строку счетчиков пользователя, посчитав их по данным:
+    изменение, которое к этому привело, уже в базе.
+    """
+    AuthorStats.objects.bulk_create([AuthorStats(
+        user_id=pk,
+        posts_count=Post.objects.filter(author_id=pk).count(),
+        followers_count=Follow.objects.filter(author_id=pk).count(),
+        following_count=Follow.objects.filter(user_id=pk).count(),
+    )], ignore_conflicts=True)
+
+
+def reference(name, delta):
+    """Сдвигает счетчик ссылок на файл картинки, заводя его при надобности."""
+    if not name:
+        return
+    if delta > 0:
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name)], ignore_conflicts=True)
+    change(MediaFile, name, 'refs', delta)
+
+
+def _count(queryset, field):
+    # подзапрос COUNT(*) по внешнему ключу для массового UPDATE
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recount():
+    """
+    Пересчитывает все счетчики одним UPDATE на таблицу.
+    Возвращает число строк, в которых счетчики разошлись с данными.
+    """
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True)
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk) for pk in missing], ignore_conflicts=True
+    )
+    real_stats = {
+        'posts_count': _count(Post.objects, 'author'),
+        'followers_count': _count(Follow.objects, 'author'),
+        'following_count': _count(Follow.objects, 'user'),
+    }
+    real_posts = {'comments_count': _count(Comment.objects, 'post')}
+    images = Post.objects.exclude(image='').order_by().values_list(
+        'image', flat=True).distinct()
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name) for name in images], ignore_conflicts=True
+    )
+    # ключ MediaFile - имя файла, так что OuterRef('pk') сравнивается с image
+    real_media = {'refs': _count(Post.objects, 'image')}
+    drift = 0
+    for model, real in (
+        (AuthorStats, real_stats),
+        (Post, real_posts),
+        (MediaFile, real_media),
+    ):
+        annotated = model.objects.annotate(
+            **{f'real_{field}': value for field, value in real.items()}
+        )
+        mismatch = Q()
+        for field in real:
+            mismatch |= ~Q(**{field: F(f'real_{field}')})
+        drift += annotated.filter(mismatch).count()
+        model.objects.update(**real)
+    return drift
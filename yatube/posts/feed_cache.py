@@ -0,0 +1,67 @@
+# Версии лент для ключей кэша.
+# Запись поста, группы или автора выдает новую версию только затронутым
+# лентам, поэтому фрагменты можно кэшировать надолго.
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'feed_version:{}'
+
+
+def _new_version():
+    # время в наносекундах: версия растет и заодно хранит момент записи
+    return time.time_ns()
+
+
+def get_versions(*scopes):
+    """Текущие версии лент в порядке `scopes`."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            # версия вытеснена из кэша - заводим новую, а не старую
+            cache.add(key, _new_version(), None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def feed_version(*scopes):
+    """Строка для ключа кэша: меняется при любой записи в ленты."""
+    return '.'.join(str(version) for version in get_versions(*scopes))
+
+
+def _set_versions(scopes):
+    version = _new_version()
+    cache.set_many(
+        {VERSION_KEY.format(scope): version for scope in scopes}, None
+    )
+
+
+def bump(*scopes):
+    """Выдает лентам новую версию, старые ключи просто перестают читаться."""
+    scopes = set(scopes)
+    _set_versions(scopes)
+    if transaction.get_connection().in_atomic_block:
+        # повторяем после коммита: до него фрагмент мог успеть
+        # закэшироваться под новой версией со старыми данными
+        transaction.on_commit(lambda: _set_versions(scopes))
+
+
+def post_scopes(author_id, group_id):
+    """Ленты, в которых показывается пост."""
+    scopes = ['index', f'author:{author_id}']
+    if group_id is not None:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def page_tags(posts, *scopes):
+    """Теги страницы для кэша: ленты плюс посты, авторы и группы на ней."""
+    tags = set(scopes)
+    for post in posts:
+        tags.add(f'post:{post.pk}')
+        tags.update(post_scopes(post.author_id, post.group_id)[1:])
+    return tags
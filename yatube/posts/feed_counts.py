@@ -0,0 +1,61 @@
+# Число постов ленты для нумерованной навигации (?page=N).
+# Точный COUNT(*) по большой ленте - полный проход по индексу на каждый
+# запрос. Поэтому лента считается с LIMIT: до FEED_COUNT_EXACT_LIMIT число
+# точное и кэшируется под версией ленты, а дальше оно оценивается по
+# частоте постов и кэшируется на FEED_COUNT_TTL без версии - оценке не
+# нужно меняться с каждым новым постом.
+from django.core.cache import cache
+
+from . import constants
+from .feed_cache import get_versions
+
+EXACT_KEY = 'feed_count:{}:{}'
+ESTIMATE_KEY = 'feed_count:{}'
+
+
+class Estimate(int):
+    """Приблизительное число: навигация показывает его со значком ≈."""
+
+    estimated = True
+
+
+def _estimate(queryset, limit):
+    # частота постов среди последних limit + 1, перенесенная на остаток
+    # ленты: три выборки по индексу (фильтр, pub_date), без COUNT(*)
+    newest_first = queryset.order_by('-pub_date', '-id').values_list(
+        'pub_date', flat=True)
+    newest, pivot = newest_first[0], newest_first[limit]
+    oldest = queryset.order_by('pub_date', 'id').values_list(
+        'pub_date', flat=True)[0]
+    recent = (newest - pivot).total_seconds()
+    if recent <= 0:
+        # все последние посты в одну секунду - частоту не оценить
+        return Estimate(queryset.count())
+    rest = (pivot - oldest).total_seconds()
+    return Estimate(limit + 1 + round(rest * limit / recent))
+
+
+def count(queryset, limit=None):
+    """Точное число постов до `limit`, дальше - оценка `Estimate`."""
+    limit = constants.FEED_COUNT_EXACT_LIMIT if limit is None else limit
+    total = queryset.order_by()[:limit + 1].count()
+    if total <= limit:
+        return total
+    return _estimate(queryset, limit)
+
+
+def feed_count(scope, queryset):
+    """Число постов ленты `scope` из кэша, при промахе - `count`."""
+    exact_key = EXACT_KEY.format(scope, *get_versions(scope))
+    estimate_key = ESTIMATE_KEY.format(scope)
+    found = cache.get_many([exact_key, estimate_key])
+    if estimate_key in found:
+        return found[estimate_key]
+    if exact_key in found:
+        return found[exact_key]
+    total = count(queryset)
+    if isinstance(total, Estimate):
+        cache.set(estimate_key, total, constants.FEED_COUNT_TTL)
+    else:
+        cache.set(exact_key, total, constants.FEED_COUNT_TTL)
+    return total
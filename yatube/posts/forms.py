@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Post, Comment
+from .uploads import reencode, too_large_error
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +15,25 @@ class PostForm(forms.ModelForm):
             'group': 'Из уже существующих'
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # файл, обрезанный на пределе размера (posts/uploads.py), не
+        # раскодируем вовсе - сразу ошибка размера
+        upload = self.files.get('image')
+        self.image_too_large = getattr(upload, 'too_large', False)
+        if self.image_too_large:
+            self.files = self.files.copy()
+            self.files.pop('image')
+
+    def clean_image(self):
+        if self.image_too_large:
+            raise too_large_error()
+        image = self.cleaned_data.get('image')
+        # новая загрузка перекодируется, прежняя картинка поста - нет
+        if isinstance(image, UploadedFile):
+            return reencode(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
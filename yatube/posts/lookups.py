@@ -0,0 +1,141 @@
+# Группы и авторы по адресу страницы (slug, username).
+# Они нужны почти каждому запросу и меняются редко, поэтому берутся из
+# двухуровневого кэша: словарь в процессе перед общим кэшем. Запись в
+# модель сбрасывает оба уровня в своем процессе; в остальных процессах
+# копия живет не дольше LOOKUP_LOCAL_TTL секунд.
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+
+from .constants import (
+    LOOKUP_LOCAL_SIZE, LOOKUP_LOCAL_TTL, LOOKUP_REPORT_EVERY,
+    LOOKUP_SHARED_TTL
+)
+from .models import Group, User
+
+logger = logging.getLogger(__name__)
+
+
+class TwoTierCache:
+    """
+    Кэш с ограниченным LRU-словарем в процессе перед общим кэшем.
+    В `stats` считаются попадания и промахи каждого уровня; раз в
+    `report_every` секунд они пишутся в лог.
+    """
+
+    def __init__(self, prefix, size=LOOKUP_LOCAL_SIZE,
+                 local_ttl=LOOKUP_LOCAL_TTL, shared_ttl=LOOKUP_SHARED_TTL,
+                 report_every=LOOKUP_REPORT_EVERY):
+        self.prefix = prefix
+        self.size = size
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.report_every = report_every
+        self.stats = Counter()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._reported = time.monotonic()
+
+    def _shared_key(self, key):
+        # в slug и username бывают символы, недопустимые в ключах memcached
+        return f'{self.prefix}:{hashlib.md5(key.encode()).hexdigest()}'
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            value = None
+            if entry is not None and entry[0] > time.monotonic():
+                self._local.move_to_end(key)
+                value = entry[1]
+        self._count('local_misses' if value is None else 'local_hits')
+        return value
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+            if time.monotonic() - self._reported < self.report_every:
+                return
+            self._reported = time.monotonic()
+            stats = {
+                name: self.stats[name] for name in (
+                    'local_hits', 'local_misses',
+                    'shared_hits', 'shared_misses')
+            }
+        logger.info(
+            'Кэш %s: в процессе %d попаданий, %d промахов; '
+            'общий %d попаданий, %d промахов', self.prefix,
+            stats['local_hits'], stats['local_misses'],
+            stats['shared_hits'], stats['shared_misses'])
+
+    def _set_local(self, key, value):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+
+    def get(self, key, load):
+        """Значение по ключу; `load()` вызывается при промахе обоих уровней
+        и возвращает None, если значения нет - такое не кэшируется."""
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        value = cache.get(self._shared_key(key))
+        if value is not None:
+            self._count('shared_hits')
+        else:
+            self._count('shared_misses')
+            value = load()
+            if value is None:
+                return None
+            cache.set(self._shared_key(key), value, self.shared_ttl)
+        self._set_local(key, value)
+        return value
+
+    def _forget(self, keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        cache.delete_many([self._shared_key(key) for key in keys])
+
+    def invalidate(self, *keys):
+        self._forget(keys)
+        if transaction.get_connection().in_atomic_block:
+            # до коммита другой запрос мог успеть закэшировать старую строку
+            transaction.on_commit(lambda: self._forget(keys))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+
+GROUP_FIELDS = ('id', 'title', 'slug', 'description')
+# пароль и служебные поля в кэш не кладем
+AUTHOR_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+groups = TwoTierCache('group_by_slug')
+authors = TwoTierCache('author_by_username')
+
+
+def _get_or_404(tier, model, fields, lookup, value):
+    # в кэше лежат значения полей, а не объект: каждый запрос получает
+    # свой экземпляр, и закэшированные на нем связи не переживают запрос
+    row = tier.get(value, lambda: model.objects.filter(
+        **{lookup: value}).values_list(*fields).first())
+    if row is None:
+        raise Http404(f'{model._meta.object_name} not found')
+    return model.from_db(DEFAULT_DB_ALIAS, fields, row)
+
+
+def get_group_or_404(slug):
+    return _get_or_404(groups, Group, GROUP_FIELDS, 'slug', slug)
+
+
+def get_author_or_404(username):
+    return _get_or_404(authors, User, AUTHOR_FIELDS, 'username', username)
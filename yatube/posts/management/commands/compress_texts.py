@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from posts import compression
+from posts.constants import TEXT_DICTIONARY_SAMPLES
+from posts.models import Comment, Post, TextDictionary
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжимает длинные тексты постов и комментариев текущим словарем, '
+        'с --train сначала обучает новый словарь на последних текстах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--train', action='store_true',
+            help='Обучить новый словарь перед сжатием')
+        parser.add_argument(
+            '--samples', type=int, default=TEXT_DICTIONARY_SAMPLES,
+            help='На скольких последних постах и комментариях обучать')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько строк читать и обновлять за раз')
+
+    def samples(self, model, ordering, count):
+        rows = model.objects.order_by(ordering).values_list(
+            'text', 'text_z')[:count]
+        return [compression.unpack(text, packed) for text, packed in rows]
+
+    def handle(self, *args, **options):
+        if options['train']:
+            count = options['samples']
+            samples = (
+                self.samples(Post, '-pub_date', count)
+                + self.samples(Comment, '-created', count)
+            )
+            data = compression.train(samples)
+            trained = TextDictionary.objects.create(
+                data=data, samples=len(samples))
+            compression.forget()
+            self.stdout.write(
+                f'Словарь {trained.pk}: {len(data) // 1024} КБ, '
+                f'текстов: {len(samples)}')
+        for label, model in (('Постов', Post), ('Комментариев', Comment)):
+            changed = compression.convert(model, options['batch_size'])
+            self.stdout.write(f'{label} пересжато: {changed}')
+        self.stdout.write(self.style.SUCCESS('Готово'))
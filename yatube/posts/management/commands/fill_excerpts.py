@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, TextField, Value, When
+from django.utils import timezone
+
+from posts.compression import unpack
+from posts.feed_cache import bump, post_scopes
+from posts.models import Post, make_excerpt
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет начало текста (excerpt) у постов, где оно пустое или '
+        'устарело. Посты читаются пачками по первичному ключу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов читать и обновлять за раз')
+
+    def update(self, excerpts):
+        # вся пачка - одним UPDATE ... CASE; updated меняется, чтобы
+        # карточки из кэша отрисовались заново
+        posts = Post.objects.filter(pk__in=excerpts)
+        scopes = set()
+        for pk, author_id, group_id in posts.values_list(
+                'pk', 'author_id', 'group_id'):
+            scopes.add(f'post:{pk}')
+            scopes.update(post_scopes(author_id, group_id))
+        with transaction.atomic():
+            posts.update(
+                excerpt=Case(
+                    *(When(pk=pk, then=Value(excerpt))
+                      for pk, excerpt in excerpts.items()),
+                    output_field=TextField()
+                ),
+                updated=timezone.now()
+            )
+            # фрагменты лент и страницы анонимов держат старое начало
+            bump(*scopes)
+
+    def handle(self, *args, **options):
+        size = options['batch_size']
+        total = Post.objects.count()
+        last, done, changed = 0, 0, 0
+        while True:
+            rows = list(
+                Post.objects.filter(pk__gt=last).order_by('pk')
+                .values_list('pk', 'text', 'text_z', 'excerpt')[:size]
+            )
+            if not rows:
+                break
+            excerpts = {}
+            for pk, text, packed, excerpt in rows:
+                # длинный текст хранится сжатым, см. posts/compression.py
+                fresh = make_excerpt(unpack(text, packed))
+                if fresh != excerpt:
+                    excerpts[pk] = fresh
+            if excerpts:
+                self.update(excerpts)
+            last = rows[-1][0]
+            done += len(rows)
+            changed += len(excerpts)
+            self.stdout.write(f'[{done}/{total}] обновлено: {len(excerpts)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {done}, обновлено: {changed}'))
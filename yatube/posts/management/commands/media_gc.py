@@ -0,0 +1,60 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.constants import MEDIA_GC_BATCH, MEDIA_GC_GRACE
+from posts.media_gc import collect
+
+STATE_FILE = '.media_gc'
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки и миниатюры, на которые не ссылается ни один '
+        'пост. Обход продолжается с места, где остановился прошлый запуск.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Сколько файлов проверить за этот запуск')
+        parser.add_argument(
+            '--batch-size', type=int, default=MEDIA_GC_BATCH,
+            help='Сколько файлов проверять между паузами')
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах')
+        parser.add_argument(
+            '--grace', type=int, default=MEDIA_GC_GRACE,
+            help='Файлы моложе стольких секунд не удаляются')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удалять')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать обход сначала')
+
+    def handle(self, *args, **options):
+        state = os.path.join(settings.MEDIA_ROOT, STATE_FILE)
+        after = None
+        if os.path.exists(state) and not options['restart']:
+            with open(state) as saved:
+                after = saved.read().strip() or None
+        stats, cursor = collect(
+            after=after,
+            limit=options['limit'],
+            batch_size=options['batch_size'],
+            grace=options['grace'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        if not options['dry_run']:
+            os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+            with open(state, 'w') as saved:
+                saved.write(cursor or '')
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено: {stats["checked"]}, удалено: {stats["deleted"]} '
+            f'({stats["freed"] // 1024} КБ), '
+            + (f'продолжение после {cursor}' if cursor else 'обход завершен')
+        ))
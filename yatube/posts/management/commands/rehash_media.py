@@ -0,0 +1,78 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+
+from posts.counters import recount
+from posts.feed_cache import bump, post_scopes
+from posts.models import Post
+from posts.storage import ContentAddressedStorage, is_content_addressed
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище по содержимому и '
+        'переписывает пути в постах. Старые файлы остаются на месте.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько файлов переносить за одно обновление постов')
+
+    def rename(self, renames):
+        # все посты пачки - одним UPDATE ... CASE; updated меняется,
+        # чтобы карточки из кэша не ссылались на старый путь
+        posts = Post.objects.filter(image__in=renames)
+        scopes = set()
+        for pk, author_id, group_id in posts.values_list(
+                'pk', 'author_id', 'group_id'):
+            scopes.add(f'post:{pk}')
+            scopes.update(post_scopes(author_id, group_id))
+        with transaction.atomic():
+            posts.update(
+                image=Case(
+                    *(When(image=old, then=Value(new))
+                      for old, new in renames.items()),
+                    output_field=CharField()
+                ),
+                updated=timezone.now()
+            )
+            # фрагменты лент и страницы анонимов тоже держат старые пути,
+            # а старые файлы потом удалит media_gc
+            bump(*scopes)
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError(
+                'DEFAULT_FILE_STORAGE должно быть ContentAddressedStorage')
+        names = [
+            name for name in Post.objects.exclude(image='').order_by()
+            .values_list('image', flat=True).distinct()
+            if not is_content_addressed(name)
+        ]
+        total, size = len(names), options['batch_size']
+        missing, stored = 0, set()
+        for start in range(0, total, size):
+            renames = {}
+            for done, name in enumerate(names[start:start + size], start + 1):
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f'[{done}/{total}] {name}: нет файла')
+                    continue
+                with storage.open(name) as content:
+                    new_name = storage.save(name, content)
+                renames[name] = new_name
+                stored.add(new_name)
+                self.stdout.write(f'[{done}/{total}] {name} -> {new_name}')
+            if renames:
+                self.rename(renames)
+        # ссылки на файлы пересчитываются вместе с остальными счетчиками
+        recount()
+        moved = total - missing
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов: {total}, перенесено: {moved}, '
+            f'одинаковых: {moved - len(stored)}, не найдено: {missing}'
+        ))
@@ -0,0 +1,142 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import compression
+from posts.constants import PUB_VALUE
+
+# слова корпуса по убыванию частоты - распределение близко к Ципфу
+WORDS = (
+    'и в не на что я с он как это по но к а из у за то так все же мы '
+    'было от бы ты еще вот его уже для если или только ее когда даже '
+    'сегодня пост группа автор подписка лента новости проект город '
+    'погода фотография фото прогулка встреча книга музыка фильм работа '
+    'выходные друзья утро вечер неделя планы идея вопрос ответ история '
+    'яндекс практикум django python сервер база данных запрос страница'
+).split()
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT NOT NULL,'
+    ' text_z BLOB, pub_date TEXT NOT NULL, author_id INTEGER NOT NULL)'
+)
+
+
+def percentiles(values, *points):
+    """Процентили `points` (доли единицы) по ближайшему рангу."""
+    ordered = sorted(values)
+    return [ordered[min(len(ordered) - 1, int(len(ordered) * point))]
+            for point in points]
+
+
+def corpus(count, seed):
+    """Посты от пары предложений до нескольких экранов текста."""
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(WORDS) + 1)]
+    texts = []
+    for _ in range(count):
+        length = int(rng.lognormvariate(5, 1)) + 5
+        words = rng.choices(WORDS, weights, k=length)
+        texts.append(' '.join(words).capitalize() + '.')
+    return texts
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает хранение текстов как есть, со сжатием zlib и со '
+        'сжатием zlib со словарем на синтетическом корпусе: размер базы, '
+        'долю таблицы в кэше страниц SQLite и время чтения ленты и поста.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--reads', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--cache-pages', type=int, default=500,
+            help='Размер кэша страниц SQLite при чтении')
+
+    def build(self, path, texts, current):
+        db = sqlite3.connect(path)
+        db.execute(SCHEMA)
+        rows = []
+        for pk, text in enumerate(texts, 1):
+            packed = (
+                None if current is None
+                else compression.compress(text, current)
+            )
+            stored = text if packed is None else ''
+            rows.append((pk, stored, packed, f'2026-01-01 {pk}', pk % 50))
+        with db:
+            db.executemany('INSERT INTO post VALUES (?, ?, ?, ?, ?)', rows)
+        db.execute('VACUUM')
+        db.close()
+
+    def measure(self, path, total, options):
+        db = sqlite3.connect(path)
+        db.execute(f'PRAGMA cache_size = {options["cache_pages"]}')
+        page_size, = db.execute('PRAGMA page_size').fetchone()
+        page_count, = db.execute('PRAGMA page_count').fetchone()
+        table_pages, = db.execute(
+            "SELECT count(*) FROM dbstat WHERE name = 'post'").fetchone()
+        rng = random.Random(options['seed'])
+        feed, detail = [], []
+        for _ in range(options['reads']):
+            # лента: столбцы после текста у PUB_VALUE подряд идущих строк
+            start = rng.randint(1, total)
+            started = time.perf_counter()
+            db.execute(
+                'SELECT id, pub_date, author_id FROM post'
+                ' WHERE id BETWEEN ? AND ?',
+                (start, start + PUB_VALUE)).fetchall()
+            feed.append(time.perf_counter() - started)
+            # страница поста: полный текст одной строки
+            started = time.perf_counter()
+            text, packed = db.execute(
+                'SELECT text, text_z FROM post WHERE id = ?',
+                (rng.randint(1, total),)).fetchone()
+            compression.unpack(text, packed)
+            detail.append(time.perf_counter() - started)
+        db.close()
+        return {
+            'size': page_size * page_count // 1024,
+            'cached': min(1, options['cache_pages'] / table_pages),
+            'feed': percentiles(feed, 0.5, 0.95),
+            'detail': percentiles(detail, 0.5, 0.95),
+        }
+
+    def handle(self, *args, **options):
+        texts = corpus(options['posts'], options['seed'])
+        dictionary = compression.train(texts[::2])
+        variants = (
+            ('как есть', None),
+            ('zlib', (0, b'')),
+            ('zlib+словарь', (1, dictionary)),
+        )
+        # словарь бенчмарка не пишется в базу - подкладываем его в кэш
+        compression.forget()
+        compression.remember(1, dictionary)
+        volume = sum(len(text.encode()) for text in texts) // 1024
+        self.stdout.write(
+            f'Постов: {len(texts)}, текста: {volume} КБ, '
+            f'словарь: {len(dictionary) // 1024} КБ')
+        self.stdout.write(
+            f'{"":<14}{"база, КБ":>10}{"в кэше":>8}'
+            f'{"лента p50/p95, мкс":>22}{"пост p50/p95, мкс":>22}')
+        with tempfile.TemporaryDirectory() as directory:
+            for number, (title, current) in enumerate(variants):
+                path = os.path.join(directory, f'{number}.sqlite3')
+                self.build(path, texts, current)
+                result = self.measure(path, len(texts), options)
+                self.stdout.write(
+                    f'{title:<14}{result["size"]:>10}'
+                    f'{result["cached"]:>8.0%}'
+                    f'{self.micro(result["feed"]):>22}'
+                    f'{self.micro(result["detail"]):>22}')
+        compression.forget()
+
+    def micro(self, quantiles):
+        # медиана и 95-й процентиль в микросекундах
+        return f'{quantiles[0] * 1e6:.0f} / {quantiles[1] * 1e6:.0f}'
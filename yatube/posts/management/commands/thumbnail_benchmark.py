@@ -0,0 +1,55 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import get_thumbnail
+
+from posts.constants import PUB_VALUE, THUMBNAILS
+from posts.models import Post
+from posts.thumbnails import prefetch
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск миниатюр страницы ленты: по одной картинке '
+        'и одним запросом на страницу. Очищает кэш!'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', default='card-960-jpeg', choices=THUMBNAILS)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def measure(self, title, func, repeat):
+        queries, elapsed = 0, 0
+        for _ in range(repeat):
+            # холодный кэш: миниатюры ищутся в KV-store заново
+            cache.clear()
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as captured:
+                func()
+            elapsed += time.perf_counter() - started
+            queries += len(captured)
+        self.stdout.write(
+            f'{title:<16}{queries / repeat:>6.1f} запросов'
+            f'{elapsed / repeat * 1000:>10.2f} мс на страницу'
+        )
+
+    def handle(self, *args, **options):
+        size, repeat = options['size'], options['repeat']
+        posts = list(
+            Post.objects.for_cards().exclude(image='')[:PUB_VALUE])
+        if not posts:
+            self.stdout.write('Нет постов с картинками')
+            return
+        geometry, thumbnail_options = THUMBNAILS[size]
+        # нарезаем заранее, чтобы сравнивать только поиск
+        prefetch(posts, [size])
+        self.stdout.write(f'Картинок на странице: {len(posts)}')
+        self.measure('по одной', lambda: [
+            get_thumbnail(post.image.name, geometry, **thumbnail_options).url
+            for post in posts
+        ], repeat)
+        self.measure('на страницу', lambda: prefetch(posts, [size]), repeat)
@@ -0,0 +1,55 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts.constants import THUMBNAIL_WORKERS
+from posts.models import Post
+from posts.thumbnails import generate, init_worker
+
+
+class Command(BaseCommand):
+    help = 'Нарезает миниатюры картинок всех постов в несколько процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=THUMBNAIL_WORKERS,
+            help='Число процессов; 0 - нарезать в текущем процессе')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Нарезать заново уже существующие миниатюры')
+
+    def report(self, done, total, name, error=None):
+        if error is not None:
+            self.stderr.write(f'[{done}/{total}] {name}: {error}')
+        else:
+            self.stdout.write(f'[{done}/{total}] {name}')
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='').order_by()
+            .values_list('image', flat=True).distinct()
+        )
+        total, failed = len(names), 0
+        if options['workers']:
+            with ProcessPoolExecutor(
+                max_workers=options['workers'], initializer=init_worker
+            ) as pool:
+                futures = {
+                    pool.submit(generate, name, options['force']): name
+                    for name in names
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    error = future.exception()
+                    failed += error is not None
+                    self.report(done, total, futures[future], error)
+        else:
+            for done, name in enumerate(names, 1):
+                try:
+                    generate(name, options['force'])
+                except Exception as error:
+                    failed += 1
+                    self.report(done, total, name, error)
+                else:
+                    self.report(done, total, name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок: {total}, с ошибками: {failed}'))
@@ -0,0 +1,189 @@
+# Сборщик осиротевших картинок.
+# Удаление поста, замена картинки в post_edit и каскадное удаление автора
+# оставляют на диске и сам файл, и его миниатюры. Сборщик обходит
+# хранилище по порядку имен, сверяет файлы с фильтром Блума по живым
+# картинкам и удаляет то, на что никто не ссылается. Обход идет пачками и
+# может прерываться: курсор - последнее проверенное имя, следующий запуск
+# продолжает с него. Память - только фильтр и одна пачка имен.
+import hashlib
+import math
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import constants
+from .models import MediaFile, Post
+from .thumbnails import thumbnail_name
+
+UPLOAD_DIR = Post._meta.get_field('image').upload_to.strip('/')
+
+
+def _prime_from(number):
+    number = max(number, 11) | 1
+    # math.isqrt есть только с Python 3.8; для размеров фильтра (меньше
+    # 2**52) корень через float точен
+    while any(number % divisor == 0
+              for divisor in range(3, int(math.sqrt(number)) + 1, 2)):
+        number += 2
+    return number
+
+
+class BloomFilter:
+    """
+    Множество имен в битовом массиве фиксированного размера.
+    «Нет» всегда точное, «есть» ошибается с долей `error_rate`.
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = _prime_from(
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # k позиций из двух половин одного хеша (Кирш - Митценмахер)
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        # размер простой, шаг ненулевой - позиции не зацикливаются
+        first = int.from_bytes(digest[:8], 'little') % self.size
+        second = int.from_bytes(digest[8:], 'little') % (self.size - 1) + 1
+        for number in range(self.hashes):
+            yield (first + number * second) % self.size
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+def referenced(error_rate=constants.MEDIA_GC_ERROR_RATE):
+    """Фильтр по картинкам всех постов и всем их миниатюрам."""
+    images = Post.objects.exclude(image='').order_by().values_list(
+        'image', flat=True)
+    sizes = list(constants.THUMBNAILS.values())
+    live = BloomFilter(images.count() * (len(sizes) + 1), error_rate)
+    for name in images.iterator():
+        live.add(name)
+        for geometry, options in sizes:
+            live.add(thumbnail_name(name, geometry, options))
+    return live
+
+
+def roots():
+    return sorted([UPLOAD_DIR, sorl_settings.THUMBNAIL_PREFIX.strip('/')])
+
+
+def _scan(parts, after):
+    try:
+        with os.scandir(os.path.join(settings.MEDIA_ROOT, *parts)) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        path = parts + (entry.name,)
+        if entry.is_dir(follow_symlinks=False):
+            # курсор внутри каталога или дальше него - заходим
+            if path >= after[:len(path)]:
+                yield from _scan(path, after)
+        elif path > after:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                # удален вместе с исходной картинкой этой же пачки
+                continue
+            yield '/'.join(path), stat
+
+
+def walk(after=None):
+    """
+    Файлы хранилища [(имя, stat)] в порядке имен, начиная после `after`.
+    Каталоги читаются по одному и отсортированными, поэтому порядок обхода
+    совпадает с порядком путей по частям, и уже пройденные поддеревья
+    пропускаются целиком, не читаясь с диска.
+    """
+    after = tuple(after.split('/')) if after else ()
+    for root in roots():
+        yield from _scan(tuple(root.split('/')), after)
+
+
+def _delete_originals(names, stats, dry_run):
+    # фильтр собран до обхода: пост мог сослаться на файл позже,
+    # поэтому кандидатов пачки сверяем с базой одним запросом
+    alive = set(
+        Post.objects.filter(image__in=names).values_list('image', flat=True))
+    for name in names:
+        if name in alive:
+            continue
+        stats['deleted'] += 1
+        stats['freed'] += names[name]
+        if not dry_run:
+            # вместе с записями sorl о картинке и ее миниатюрах
+            default.kvstore.delete(ImageFile(name))
+            default_storage.delete(name)
+    if not dry_run:
+        MediaFile.objects.filter(name__in=set(names) - alive).delete()
+
+
+def _delete_thumbnails(names, stats, dry_run):
+    for name, size in names.items():
+        stats['deleted'] += 1
+        stats['freed'] += size
+        if not dry_run:
+            thumbnail = ImageFile(name, default.storage)
+            default.kvstore.delete(thumbnail, delete_thumbnails=False)
+            default.storage.delete(name)
+
+
+def _delete(batch, stats, dry_run):
+    originals = {
+        name: size for name, size in batch.items()
+        if name.startswith(UPLOAD_DIR + '/')
+    }
+    thumbnails = {
+        name: size for name, size in batch.items() if name not in originals
+    }
+    if originals:
+        _delete_originals(originals, stats, dry_run)
+    if thumbnails:
+        _delete_thumbnails(thumbnails, stats, dry_run)
+
+
+def collect(after=None, limit=None, batch_size=constants.MEDIA_GC_BATCH,
+            grace=constants.MEDIA_GC_GRACE, pause=0, dry_run=False,
+            live=None):
+    """
+    Проверяет до `limit` файлов после курсора `after` и удаляет те, на
+    которые не ссылается ни один пост и которые старше `grace` секунд.
+    Между пачками по `batch_size` файлов спит `pause` секунд, чтобы не
+    забирать весь диск. Возвращает (статистика, курсор); курсор None -
+    хранилище пройдено до конца.
+    """
+    live = referenced() if live is None else live
+    deadline = time.time() - grace
+    stats, batch, cursor = Counter(), {}, after
+    for name, stat in walk(after):
+        if limit is not None and stats['checked'] >= limit:
+            break
+        stats['checked'] += 1
+        cursor = name
+        if name not in live and stat.st_mtime < deadline:
+            batch[name] = stat.st_size
+        if stats['checked'] % batch_size == 0:
+            _delete(batch, stats, dry_run)
+            batch = {}
+            time.sleep(pause)
+    else:
+        cursor = None
+    _delete(batch, stats, dry_run)
+    return stats, cursor
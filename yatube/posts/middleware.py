@@ -0,0 +1,71 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .constants import PAGE_CACHE_TTL
+from .feed_cache import get_versions
+
+PAGE_KEY = 'anonymous_page:{}'
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Кэш готовых страниц для анонимных читателей.
+
+    Страница кэшируется, только если view пометил ответ тегами
+    (`response.cache_tags`) - id постов, авторов и групп на странице.
+    Запись в любой из них выдает тегу новую версию (posts/feed_cache.py),
+    и закэшированная страница перестает совпадать по версиям.
+    Попадание в кэш отдается раньше сессий, авторизации и шаблонов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_cacheable(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def __call__(self, request):
+        if not self.is_cacheable(request):
+            return self.get_response(request)
+        key = PAGE_KEY.format(
+            hashlib.md5(request.get_full_path().encode()).hexdigest()
+        )
+        entry = cache.get(key)
+        if entry is not None:
+            tags, versions, response = entry
+            if get_versions(*tags) == versions:
+                # валидаторы сохранены вместе со страницей - можно ответить 304
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        response.get('Last-Modified', '')),
+                    response=response,
+                )
+
+        started = time.time_ns()
+        response = self.get_response(request)
+        tags = sorted(getattr(response, 'cache_tags', ()))
+        if (
+            not tags
+            # часть страницы отдана из устаревшего фрагмента
+            or getattr(request, 'stale_fragment', False)
+            or response.status_code != 200
+            or response.streaming
+            or response.cookies
+        ):
+            return response
+        versions = get_versions(*tags)
+        # версия новее начала запроса - страница могла собраться
+        # из данных до записи, такую не кэшируем
+        if max(versions) <= started:
+            cache.set(key, (tags, versions, response), PAGE_CACHE_TTL)
+        return response
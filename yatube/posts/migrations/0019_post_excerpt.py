@@ -0,0 +1,63 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:28
+# Начало текста заполняется здесь же, пачками, чтобы карточки в лентах
+# не остались пустыми; fill_excerpts пересчитывает его позже, например
+# после смены EXCERPT_LENGTH.
+# SQLite добавляет столбец, пересоздавая таблицу постов, и триггеры
+# полнотекстового индекса из 0017 уходят вместе со старой таблицей -
+# ставим их заново после изменения схемы в обе стороны.
+from importlib import import_module
+
+from django.db import migrations, models
+
+from posts.models import make_excerpt
+
+search_migration = import_module('posts.migrations.0017_post_search')
+
+BATCH_SIZE = 500
+
+
+def fill_excerpts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.only('text').order_by('pk')
+    batch = []
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        post.excerpt = make_excerpt(post.text)
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            Post.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    Post.objects.bulk_update(batch, ['excerpt'])
+
+
+def restore_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'posts_post_fts'")
+        if cursor.fetchone() is None:
+            # SQLite без FTS5 - индекса нет
+            return
+        for statement in search_migration.DROP[:-1]:
+            cursor.execute(statement)
+        for trigger in search_migration.TRIGGERS:
+            cursor.execute(trigger)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_media_file'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(default='', editable=False, verbose_name='Начало текста'),
+        ),
+        # до триггеров: текст не меняется, индексу обновлять нечего
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:33
+# Сжатие длинных текстов, см. posts/compression.py.
+# Сжатый текст лежит в text_z, поэтому полнотекстовый индекс из 0017
+# переводится с таблицы постов на представление posts_post_body, где
+# текст уже распакован функцией posts_text(). Существующие тексты
+# сжимаются пачками, пока без словаря - его обучает compress_texts.
+from importlib import import_module
+
+from django.db import OperationalError, migrations, models
+
+from posts import compression
+
+search_migration = import_module('posts.migrations.0017_post_search')
+BATCH_SIZE = 500
+
+CREATE_VIEW = (
+    "CREATE VIEW posts_post_body AS"
+    " SELECT id, posts_text(text, text_z) AS text FROM posts_post"
+)
+CREATE_INDEX = search_migration.CREATE_INDEX.replace(
+    "content='posts_post'", "content='posts_post_body'")
+BODY = 'posts_text({0}.text, {0}.text_z)'
+TRIGGERS = (
+    "CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN"
+    " INSERT INTO posts_post_fts (rowid, text)"
+    f" VALUES (new.id, {BODY.format('new')});"
+    " END",
+    "CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN"
+    " INSERT INTO posts_post_fts (posts_post_fts, rowid, text)"
+    f" VALUES ('delete', old.id, {BODY.format('old')});"
+    " END",
+    "CREATE TRIGGER posts_post_fts_update"
+    " AFTER UPDATE OF text, text_z ON posts_post BEGIN"
+    " INSERT INTO posts_post_fts (posts_post_fts, rowid, text)"
+    f" VALUES ('delete', old.id, {BODY.format('old')});"
+    " INSERT INTO posts_post_fts (rowid, text)"
+    f" VALUES (new.id, {BODY.format('new')});"
+    " END",
+)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CREATE_VIEW)
+        try:
+            cursor.execute(CREATE_INDEX)
+        except OperationalError:
+            # SQLite собран без FTS5 - поиск работает через LIKE
+            return
+        for trigger in TRIGGERS:
+            cursor.execute(trigger)
+        cursor.execute(
+            "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('rebuild')")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search_migration.drop_index(apps, schema_editor)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP VIEW IF EXISTS posts_post_body')
+
+
+def compress_texts(apps, schema_editor):
+    for name in ('Post', 'Comment'):
+        compression.convert(
+            apps.get_model('posts', name), BATCH_SIZE, current=(0, b''))
+
+
+def expand_texts(apps, schema_editor):
+    for name in ('Post', 'Comment'):
+        compression.convert(
+            apps.get_model('posts', name), BATCH_SIZE, compressed=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_excerpt'),
+    ]
+
+    operations = [
+        # триггеры 0017 передают в индекс столбец text, пустой у сжатых строк
+        migrations.RunPython(
+            search_migration.drop_index, search_migration.create_index),
+        migrations.CreateModel(
+            name='TextDictionary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField(verbose_name='Словарь')),
+                ('samples', models.PositiveIntegerField(default=0, verbose_name='Обучен на текстах')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'Словарь сжатия',
+                'verbose_name_plural': 'Словари сжатия',
+            },
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='text_z',
+            field=models.BinaryField(null=True, verbose_name='Сжатый текст'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_z',
+            field=models.BinaryField(null=True, verbose_name='Сжатый текст'),
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(compress_texts, expand_texts),
+    ]
@@ -2,7 +2,32 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models import UniqueConstraint
 
+from . import compression
+from .constants import EXCERPT_LENGTH
+
 User = get_user_model()
+ELLIPSIS = '…'
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """
+    Начало текста для карточки: первый абзац, но не длиннее `length`
+    символов и без обрезанного слова. Обрезанное кончается многоточием.
+    """
+    text = text.strip()
+    excerpt = text.split('\n\n', 1)[0].rstrip()
+    if len(excerpt) > length:
+        cut = excerpt[:length + 1]
+        words = cut.rsplit(None, 1)
+        if cut[-1].isspace() or len(words) == 1:
+            # срез кончается на границе слова или слово всего одно
+            excerpt = cut[:length]
+        else:
+            # последнее слово попало в срез не целиком
+            excerpt = words[0]
+    if excerpt == text:
+        return text
+    return excerpt.rstrip() + ELLIPSIS
 
 
 class Group(models.Model):
@@ -25,15 +50,90 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class CompressedTextMixin:
+    """
+    Длинный `text` хранится сжатым в `text_z` (posts/compression.py),
+    столбец `text` тогда пуст. Такой текст остается отложенным полем
+    и распаковывается при первом обращении, без запроса к базе.
+    Поэтому фильтры ORM по `text` длинных текстов не находят - в
+    запросах текст берется через compression.body().
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        fields = instance.__dict__
+        if fields.get('text') == '' and fields.get('text_z') is not None:
+            del fields['text']
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        if fields is not None and 'text' in fields:
+            fields = [field for field in fields if field != 'text']
+            if 'text_z' not in self.__dict__:
+                # сжатый текст еще не загружен - читаем оба столбца
+                fields += ['text', 'text_z']
+            elif self.text_z is not None:
+                self.text = compression.decompress(self.text_z)
+            else:
+                fields.append('text')
+            if not fields:
+                return
+        super().refresh_from_db(using, fields)
+
+    def save(self, *args, **kwargs):
+        if 'text' in self.get_deferred_fields():
+            # текст не загружался и не менялся
+            return super().save(*args, **kwargs)
+        text = self.text
+        self.text_z = compression.compress(text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'text_z'}
+        if self.text_z is not None:
+            self.text = ''
+        try:
+            return super().save(*args, **kwargs)
+        finally:
+            self.text = text
+
+
+class PostQuerySet(models.QuerySet):
+    def for_cards(self):
+        """
+        Посты со всем, что выводит карточка в ленте: автор и группа.
+        Все ленты строятся отсюда, чтобы не расходиться в подгрузке.
+        Полный текст не читается: карточке хватает `excerpt`.
+        """
+        return self.select_related('author', 'group').defer('text', 'text_z')
+
+
+class Post(CompressedTextMixin, models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Введите текст поста'
     )
+    # длинный текст, сжатый zlib, см. CompressedTextMixin
+    text_z = models.BinaryField(
+        null=True,
+        editable=False,
+        verbose_name='Сжатый текст'
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    # начало текста для лент, обновляется в save(), см. make_excerpt
+    excerpt = models.TextField(
+        default='',
+        editable=False,
+        verbose_name='Начало текста'
+    )
+    # версия карточки поста в кэше, см. posts/templatetags/post_cards.py
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -57,17 +157,51 @@ class Post(models.Model):
         blank='True'
 
     )
+    # счетчик поддерживается сигналами, см. posts/counters.py
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # индексы под фильтр и сортировку каждой ленты
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # у поста из ленты текст не загружен - тогда и начало не меняется
+        if 'text' not in self.get_deferred_fields():
+            self.excerpt = make_excerpt(self.text)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'text' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        super().save(*args, **kwargs)
+
+    @property
+    def excerpt_truncated(self):
+        # в карточке нужна ссылка на полный текст
+        return self.excerpt.endswith(ELLIPSIS)
 
-class Comment(models.Model):
+
+class Comment(CompressedTextMixin, models.Model):
     post = models.ForeignKey(
         Post,
         related_name='comments',
@@ -83,6 +217,12 @@ class Comment(models.Model):
     )
 
     text = models.TextField(verbose_name='Комментарий')
+    # длинный текст, сжатый zlib, см. CompressedTextMixin
+    text_z = models.BinaryField(
+        null=True,
+        editable=False,
+        verbose_name='Сжатый текст'
+    )
     created = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата Публикации'
@@ -90,6 +230,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('created',)
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return 'Автор : {}, пост: {}'.format(self.name, self.post)
@@ -114,3 +259,110 @@ class Follow(models.Model):
             UniqueConstraint(
                 fields=['user', 'author'], name='unique_following')
         ]
+        indexes = [
+            # обратный порядок к unique_following: поиск по автору
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    # Счетчики пользователя, чтобы не считать их агрегатами на каждой странице
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики автора'
+        verbose_name_plural = 'Счетчики авторов'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    # Готовая лента подписок: строка на каждый пост для каждого подписчика
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx'
+            ),
+        ]
+
+
+class MediaFile(models.Model):
+    # Файл в хранилище по содержимому (posts/storage.py): один файл на много
+    # постов с одинаковой картинкой, refs - сколько постов на него ссылается
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Файл'
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Ссылок'
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class TextDictionary(models.Model):
+    # Словарь zlib для сжатия текстов, см. posts/compression.py.
+    # Словари не меняются: сжатый текст ссылается на свой по номеру
+    data = models.BinaryField(verbose_name='Словарь')
+    samples = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Обучен на текстах'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создан'
+    )
+
+    class Meta:
+        verbose_name = 'Словарь сжатия'
+        verbose_name_plural = 'Словари сжатия'
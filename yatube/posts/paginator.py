@@ -0,0 +1,172 @@
+import base64
+import binascii
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .constants import PAGE_ENDS, PAGE_WINDOW
+
+
+class KeysetPaginator(Paginator):
+    """
+    Паджинатор по ключу (курсору) вместо OFFSET.
+
+    Страница выбирается условием по полям сортировки
+    (по умолчанию `(pub_date, id)`, либо явный `order_by` выборки),
+    поэтому любая страница стоит одного прохода по индексу
+    и не требует COUNT(*).
+    Обычная паджинация по номеру (`get_page`) остается рабочей;
+    число объектов для нее можно передать функцией `count`
+    (счетчик или оценка, см. posts/feed_counts.py), тогда COUNT(*)
+    не выполняется.
+    """
+
+    ordering = ('-pub_date', '-id')
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, ordering=None, count=None,
+                 **kwargs):
+        self.count_source = count
+        if ordering is None and object_list.query.order_by:
+            ordering = object_list.query.order_by
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        self.keys = tuple(field.lstrip('-') for field in self.ordering)
+        self.descending = self.ordering[0].startswith('-')
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+
+    @cached_property
+    def count(self):
+        if self.count_source is not None:
+            return self.count_source()
+        return super().count
+
+    @property
+    def estimated(self):
+        """Число страниц оценено, а не посчитано."""
+        return getattr(self.count, 'estimated', False)
+
+    def get_elided_page_range(self, number=1, on_each_side=PAGE_WINDOW,
+                              on_ends=PAGE_ENDS):
+        """
+        Номера страниц вокруг `number` и по краям, пропуски - ELLIPSIS:
+        1 … 4 5 6 7 8 … 50 вместо всех 50 номеров.
+        """
+        number = self.validate_number(number)
+        last = self.num_pages
+        if last <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < last - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(last - on_ends + 1, last + 1)
+        else:
+            yield from range(number + 1, last + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        # шаблон не вызывает методы с аргументами - окно считаем здесь
+        page.page_window = list(self.get_elided_page_range(page.number))
+        return page
+
+    def encode_cursor(self, obj):
+        """Непрозрачный токен с ключом сортировки объекта."""
+        values = []
+        for key in self.keys:
+            value = getattr(obj, key)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(str(value))
+        token = base64.urlsafe_b64encode('|'.join(values).encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        """Возвращает значения ключа или None, если токен битый."""
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            values = raw.decode().split('|')
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        if len(values) != len(self.keys):
+            return None
+        try:
+            return [
+                self._field(key).to_python(value)
+                for key, value in zip(self.keys, values)
+            ]
+        except ValidationError:
+            return None
+
+    def _field(self, key):
+        # ключом может быть и аннотация выборки
+        annotation = self.object_list.query.annotations.get(key)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(key)
+
+    def _seek(self, values, forward):
+        # k1 <= v1 AND ((k1 < v1) OR (k1 = v1 AND k2 < v2) OR ...)
+        # для убывающей сортировки; внешнее условие по первому ключу
+        # дает SQLite диапазон по индексу без сортировки во временном дереве
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for position, key in enumerate(self.keys):
+            prefix = dict(zip(self.keys[:position], values[:position]))
+            prefix[f'{key}__{lookup}'] = values[position]
+            condition |= Q(**prefix)
+        return Q(**{f'{self.keys[0]}__{lookup}e': values[0]}) & condition
+
+    def get_cursor_page(self, after=None, before=None):
+        """
+        Страница после курсора `after` или перед курсором `before`.
+        Без курсора возвращается первая страница.
+        """
+        queryset = self.object_list
+        after_values = self.decode_cursor(after)
+        before_values = self.decode_cursor(before)
+        if before_values is not None:
+            reverse = [
+                field[1:] if field.startswith('-') else '-' + field
+                for field in self.ordering
+            ]
+            rows = list(
+                queryset.filter(self._seek(before_values, forward=False))
+                .order_by(*reverse)[:self.per_page + 1]
+            )
+            if len(rows) <= self.per_page:
+                # Дошли до начала ленты - показываем полную первую страницу
+                return self.get_cursor_page()
+            items = rows[:self.per_page][::-1]
+            return self._cursor_page(items, has_previous=True, has_next=True)
+        if after_values is not None:
+            queryset = queryset.filter(self._seek(after_values, forward=True))
+        rows = list(queryset[:self.per_page + 1])
+        return self._cursor_page(
+            rows[:self.per_page],
+            has_previous=after_values is not None,
+            has_next=len(rows) > self.per_page,
+        )
+
+    def _cursor_page(self, items, has_previous, has_next):
+        page = Page(items, 1 if not has_previous else None, self)
+        page.is_keyset = True
+        page.previous_cursor = (
+            self.encode_cursor(items[0]) if has_previous and items else None
+        )
+        page.next_cursor = (
+            self.encode_cursor(items[-1]) if has_next and items else None
+        )
+        return page
@@ -0,0 +1,138 @@
+# Полнотекстовый поиск по постам.
+# Слова постов лежат в FTS5-индексе posts_post_fts (миграция 0017), поиск
+# идет по нему с ранжированием BM25. Если SQLite собран без FTS5,
+# используется медленный поиск через LIKE.
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from .compression import body
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+# границы найденных слов в сниппете: управляющие символы не встречаются
+# в тексте и переживают экранирование HTML
+MARK_START, MARK_END = '\x02', '\x03'
+SNIPPET_WORDS = 16
+
+_fts_tables = {}
+
+
+def fts_available():
+    # таблица создается миграцией, только если в SQLite есть FTS5
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_tables[name]
+
+
+def words(query):
+    return re.findall(r'\w+', query.lower())[:10]
+
+
+def match_expression(query):
+    """
+    Запрос пользователя в синтаксисе FTS5: все слова обязательны,
+    последнее ищется и как начало слова. Кавычки и операторы FTS5
+    из ввода не проходят - каждое слово берется в кавычки.
+    """
+    found = words(query)
+    if not found:
+        return None
+    terms = [f'"{word}"' for word in found]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """Экранирует сниппет и выделяет найденные слова тегом <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def _fts_search(match, offset, limit, group_id, author_id):
+    sql = [
+        f'SELECT post.id, snippet({FTS_TABLE}, 0, %s, %s, %s, %s)',
+        f'FROM {FTS_TABLE} JOIN posts_post AS post'
+        f' ON post.id = {FTS_TABLE}.rowid',
+        f'WHERE {FTS_TABLE} MATCH %s',
+    ]
+    params = [MARK_START, MARK_END, '…', SNIPPET_WORDS, match]
+    if group_id is not None:
+        sql.append('AND post.group_id = %s')
+        params.append(group_id)
+    if author_id is not None:
+        sql.append('AND post.author_id = %s')
+        params.append(author_id)
+    # rank во встроенной FTS5 - это bm25()
+    sql.append('ORDER BY rank LIMIT %s OFFSET %s')
+    params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        return cursor.fetchall()
+
+
+def _like_filter(queryset, query):
+    # длинные тексты сжаты - сравниваем с распакованным
+    condition = Q()
+    for word in words(query):
+        condition &= Q(body__icontains=word)
+    return queryset.annotate(body=body()).filter(condition)
+
+
+def _like_search(query, offset, limit, group_id, author_id):
+    posts = _like_filter(Post.objects.all(), query)
+    if group_id is not None:
+        posts = posts.filter(group_id=group_id)
+    if author_id is not None:
+        posts = posts.filter(author_id=author_id)
+    return [
+        (pk, Truncator(text).words(SNIPPET_WORDS))
+        for pk, text in posts.values_list('pk', 'body')[offset:offset + limit]
+    ]
+
+
+def search_posts(query, offset=0, limit=10, group_id=None, author_id=None):
+    """
+    Посты, подходящие под запрос, от самых релевантных.
+    У каждого поста есть `snippet` - кусок текста с выделенными словами.
+    """
+    match = match_expression(query)
+    if match is None:
+        return []
+    if fts_available():
+        found = _fts_search(match, offset, limit, group_id, author_id)
+    else:
+        found = _like_search(query, offset, limit, group_id, author_id)
+    posts = Post.objects.for_cards().in_bulk([pk for pk, snippet in found])
+    results = []
+    for pk, snippet in found:
+        # пост мог быть удален между запросами
+        if pk in posts:
+            posts[pk].snippet = highlight(snippet)
+            results.append(posts[pk])
+    return results
+
+
+def filter_queryset(queryset, query):
+    """Выборка, сужённая полнотекстовым поиском (для админки)."""
+    match = match_expression(query)
+    if match is None:
+        return queryset
+    if not fts_available():
+        return _like_filter(queryset, query)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,)
+    ))
@@ -0,0 +1,176 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, feed_cache, lookups, timeline
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def _login_only(update_fields):
+    # вход на сайт меняет только last_login
+    return update_fields is not None and set(update_fields) == {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Group)
+def lookup_before_save(sender, instance, raw=False, update_fields=None,
+                       **kwargs):
+    # запоминаем прежний адрес: после переименования его копию в кэше
+    # тоже нужно сбросить
+    instance._old_lookup_key = None
+    if raw or instance.pk is None or _login_only(update_fields):
+        return
+    field = 'slug' if sender is Group else 'username'
+    instance._old_lookup_key = sender.objects.filter(
+        pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def lookup_changed(sender, instance, update_fields=None, **kwargs):
+    if _login_only(update_fields):
+        return
+    if sender is Group:
+        tier, key = lookups.groups, instance.slug
+    else:
+        tier, key = lookups.authors, instance.username
+    old_key = getattr(instance, '_old_lookup_key', None)
+    tier.invalidate(*{key, old_key} - {None})
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if raw:
+        return
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+        return
+    if _login_only(update_fields):
+        # вход на сайт ничего не меняет в лентах
+        return
+    # карточки постов автора получают новую версию
+    Post.objects.filter(author=instance).update(updated=timezone.now())
+    # имя автора показывается в ленте, в его профиле и в группах с его постами
+    groups = (
+        Post.objects.filter(author=instance, group__isnull=False)
+        .order_by()
+        .values_list('group_id', flat=True)
+        .distinct()
+    )
+    # и у его комментариев: страница поста проверяет по ETag только
+    # версию поста, а не версии всех комментаторов
+    commented = (
+        Comment.objects.filter(author=instance)
+        .order_by()
+        .values_list('post_id', flat=True)
+        .distinct()
+    )
+    feed_cache.bump(
+        'index',
+        f'author:{instance.pk}',
+        *(f'group:{group_id}' for group_id in groups),
+        *(f'post:{post_id}' for post_id in commented)
+    )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    feed_cache.bump('index', f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # ссылка на группу есть в карточках ее постов
+    Post.objects.filter(group=instance).update(updated=timezone.now())
+    feed_cache.bump('index', f'group:{instance.pk}')
+
+
+@receiver(pre_save, sender=Post)
+def post_before_save(sender, instance, raw=False, **kwargs):
+    # запоминаем ленты, где пост был до правки: из них он может уйти,
+    # и прежнюю картинку: на нее становится одной ссылкой меньше
+    instance._old_feed_scopes = []
+    instance._old_image = ''
+    if raw or instance.pk is None:
+        return
+    old = Post.objects.filter(pk=instance.pk).values(
+        'author_id', 'group_id', 'image').first()
+    if old is not None:
+        instance._old_feed_scopes = feed_cache.post_scopes(
+            old['author_id'], old['group_id'])
+        instance._old_image = old['image']
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    # новый пост попадает в ленты подписчиков, правленый - раскладывается
+    # заново; удаленный пост уходит из лент каскадом по внешнему ключу
+    if raw:
+        return
+    feed_cache.bump(
+        f'post:{instance.pk}',
+        *feed_cache.post_scopes(instance.author_id, instance.group_id),
+        *getattr(instance, '_old_feed_scopes', [])
+    )
+    old_image = getattr(instance, '_old_image', '')
+    if instance.image.name != old_image:
+        counters.reference(instance.image.name, 1)
+        counters.reference(old_image, -1)
+    if created:
+        counters.change(AuthorStats, instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+    else:
+        timeline.refresh(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(AuthorStats, instance.author_id, 'posts_count', -1)
+    # файл остается на диске, даже когда ссылок на него больше нет
+    counters.reference(instance.image.name, -1)
+    feed_cache.bump(
+        f'post:{instance.pk}',
+        *feed_cache.post_scopes(instance.author_id, instance.group_id)
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(Post, instance.post_id, 'comments_count', 1)
+        feed_cache.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change(Post, instance.post_id, 'comments_count', -1)
+    feed_cache.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change(AuthorStats, instance.author_id, 'followers_count', 1)
+        counters.change(AuthorStats, instance.user_id, 'following_count', 1)
+        timeline.backfill(instance)
+        # счетчик подписчиков виден в профиле автора
+        feed_cache.bump(
+            f'follow:{instance.user_id}', f'author:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change(AuthorStats, instance.author_id, 'followers_count', -1)
+    counters.change(AuthorStats, instance.user_id, 'following_count', -1)
+    timeline.remove(instance)
+    timeline.demote(instance.author_id)
+    feed_cache.bump(
+        f'follow:{instance.user_id}', f'author:{instance.author_id}')
@@ -0,0 +1,86 @@
+# Защита от "давки" при пересборке кэша.
+# Пересчитывает значение один запрос, остальные получают старое значение
+# или ждут готового; незадолго до истечения значение с некоторой
+# вероятностью пересчитывается заранее (XFetch), чтобы промаха не было вовсе.
+import math
+import random
+import time
+from functools import wraps
+
+from django.core.cache import cache
+
+from .constants import (
+    FLIGHT_BETA, FLIGHT_LOCK_TTL, FLIGHT_POLL, FLIGHT_WAIT
+)
+
+LOCK_KEY = '{}:lock'
+
+
+def _expired(expires_at, delta, beta):
+    # чем дольше пересчет и ближе истечение, тем вероятнее ранний пересчет
+    return time.time() - delta * beta * math.log(
+        1 - random.random()) >= expires_at
+
+
+def _compute(key, compute, timeout, version):
+    started = time.time()
+    try:
+        value = compute()
+        delta = time.time() - started
+        # запись живет вдвое дольше срока: после него она еще
+        # отдается как устаревшая, пока идет пересчет
+        cache.set(
+            key, (value, version, started + timeout, delta), timeout * 2)
+    finally:
+        cache.delete(LOCK_KEY.format(key))
+    return value
+
+
+def fetch(key, compute, timeout, version=None, beta=FLIGHT_BETA):
+    """
+    Возвращает (значение, свежее ли оно).
+    Значение под ключом считается свежим, пока совпадает `version`
+    и не истек `timeout`; пересчитывает его только один вызов.
+    """
+    lock_key = LOCK_KEY.format(key)
+    entry = cache.get(key)
+    if entry is not None:
+        value, entry_version, expires_at, delta = entry
+        if entry_version == version and not _expired(
+                expires_at, delta, beta):
+            return value, True
+        if not cache.add(lock_key, 1, FLIGHT_LOCK_TTL):
+            # пересчет уже идет - отдаем то, что есть
+            return value, entry_version == version
+        return _compute(key, compute, timeout, version), True
+
+    if cache.add(lock_key, 1, FLIGHT_LOCK_TTL):
+        return _compute(key, compute, timeout, version), True
+    # отдать нечего - ждем, пока значение положит пересчитывающий
+    deadline = time.time() + FLIGHT_WAIT
+    while time.time() < deadline:
+        time.sleep(FLIGHT_POLL)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry[0], True
+    # пересчитывающий завис или упал - считаем сами, без записи
+    return compute(), True
+
+
+def single_flight(timeout, key, beta=FLIGHT_BETA):
+    """
+    Декоратор: кэширует результат функции под ключом `key(*args, **kwargs)`
+    с защитой от одновременного пересчета.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            value, fresh = fetch(
+                key(*args, **kwargs),
+                lambda: func(*args, **kwargs),
+                timeout,
+                beta=beta,
+            )
+            return value
+        return wrapper
+    return decorator
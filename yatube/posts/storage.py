@@ -0,0 +1,64 @@
+# Хранилище картинок постов по содержимому.
+# Файл называется хешем своего содержимого и лежит в двух уровнях
+# подкаталогов: posts/ab/cd/abcd….jpg. Каталоги не разрастаются до сотен
+# тысяч файлов, а одинаковая картинка хранится один раз, сколько бы раз
+# ее ни загрузили. Ссылки на файлы считает
+# posts/counters.py (MediaFile).
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME = re.compile(
+    r'(?:^|/)(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/(?P=a)(?P=b)[0-9a-f]{60}'
+    r'(?:\.\w+)?$'
+)
+
+
+def digest(content):
+    """SHA-256 содержимого файла, читается кусками."""
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha.hexdigest()
+
+
+def content_name(name, hexdigest):
+    """Имя файла по хешу: каталог загрузки, два уровня шардов, расширение."""
+    directory, basename = os.path.split(name)
+    extension = os.path.splitext(basename)[1].lower()
+    return os.path.join(
+        directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension)
+
+
+def is_content_addressed(name):
+    return CONTENT_NAME.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # имя все равно заменяется хешем в _save, а одинаковые хеши -
+        # это один и тот же файл, так что подбирать свободное имя незачем
+        return name
+
+    def _save(self, name, content):
+        name = content_name(name, digest(content))
+        if self.exists(name):
+            # такая картинка уже есть - второй копии не пишем, только
+            # освежаем дату: сборщик мусора не тронет файл, на который
+            # только что снова сослались (posts/media_gc.py)
+            os.utime(self.path(name))
+            return name
+        # пишем во временный файл и переименовываем: одновременные загрузки
+        # одной картинки не видят недописанный файл и не мешают друг другу
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -0,0 +1,43 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..constants import CARD_CACHE_TTL
+from ..thumbnails import prefetch, variants
+
+register = template.Library()
+
+CARD_KEY = 'post_card:{}:{}'
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_key(post):
+    # updated меняется при правке поста, его автора или группы
+    return CARD_KEY.format(post.pk, post.updated.timestamp())
+
+
+@register.simple_tag
+def post_cards(posts):
+    """
+    Возвращает отрисованные карточки постов страницы.
+    Готовые карточки берутся из кэша одним get_many,
+    отрисовываются только недостающие.
+    """
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missing_posts = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    # миниатюры всех ширин и форматов недостающих карточек - одним запросом
+    prefetch([post for key, post in missing_posts],
+             [size for size, *rest in variants('card')])
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {'post': post})
+        for key, post in missing_posts
+    }
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TTL)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,33 @@
+from django import template
+
+from ..thumbnails import prefetch, variants
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/responsive_image.html')
+def responsive_image(post, image):
+    """
+    Картинка поста в <picture>: WebP и JPEG нескольких ширин в srcset,
+    размеры для резервирования места и ленивая загрузка.
+    """
+    if not post.image:
+        return {}
+    found = variants(image)
+    prefetched = getattr(post, 'thumbnails', {})
+    if any(size not in prefetched for size, *rest in found):
+        # карточка вне ленты (страница поста) - все ширины одним запросом
+        prefetch([post], [size for size, *rest in found])
+    sources = {}
+    for size, image_format, width, height in found:
+        sources.setdefault(image_format, []).append(
+            f'{post.thumbnails[size]} {width}w')
+    # запасной src и размеры - самая широкая JPEG-миниатюра
+    size, image_format, width, height = found[-1]
+    return {
+        'webp_srcset': ', '.join(sources.get('WEBP', [])),
+        'jpeg_srcset': ', '.join(sources.get('JPEG', [])),
+        'src': post.thumbnails[size],
+        'width': width,
+        'height': height,
+    }
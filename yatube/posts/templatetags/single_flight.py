@@ -0,0 +1,64 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from ..single_flight import fetch
+
+register = template.Library()
+
+
+class SingleFlightNode(template.Node):
+    def __init__(self, nodelist, expire_time, fragment_name, vary_on,
+                 version):
+        self.nodelist = nodelist
+        self.expire_time = expire_time
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on]
+        )
+        value, fresh = fetch(
+            key,
+            lambda: self.nodelist.render(context),
+            int(self.expire_time.resolve(context)),
+            version=self.version and self.version.resolve(context),
+        )
+        request = context.get('request')
+        if not fresh and request is not None:
+            # страница собрана из устаревшего фрагмента: ее нельзя
+            # кэшировать и отдавать с валидаторами новой версии
+            request.stale_fragment = True
+        return value
+
+
+@register.tag
+def singleflight(parser, token):
+    """
+    Как {% cache %}, но фрагмент пересобирает только один запрос,
+    остальные на это время получают прежнюю версию:
+
+        {% singleflight 86400 index_page request version=feed_version %}
+            ...
+        {% endsingleflight %}
+
+    Смена `version` не меняет ключ, а помечает фрагмент устаревшим.
+    """
+    nodelist = parser.parse(('endsingleflight',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.')
+    version = None
+    if tokens[-1].startswith('version='):
+        version = parser.compile_filter(tokens.pop()[len('version='):])
+    return SingleFlightNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        version,
+    )
@@ -1,6 +1,13 @@
 # Здесь будем тестировать работаспособность кэша
+import threading
+import time
+
 from django.core.cache import cache
-from posts.models import Post, Group
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from posts.models import Comment, Post, Group
+from posts import lookups, single_flight
 from django.test import Client, TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -18,15 +25,25 @@ class CachePageTests(TestCase):
             slug='tmp_slug',
             description='tmp_description'
         )
+        cls.other_group = Group.objects.create(
+            title='other_title',
+            slug='other_slug',
+            description='other_description'
+        )
 
         cls.post = Post.objects.create(
             author=cls.author,
             text='cache_post_test',
             group=cls.group
         )
+        cls.other_post = Post.objects.create(
+            author=User.objects.create_user(username='OtherCacheUser'),
+            text='other_cache_post',
+            group=cls.other_group
+        )
 
     def setUp(self):
-
+        cache.clear()
         # Создаем неавторизованного клиента
         self.guest_client = Client()
 
@@ -38,11 +55,9 @@ class CachePageTests(TestCase):
         )
         # убеждаемся что этот пост который будем удалит существует
         self.assertContains(response, 'cache_post_test')
-        # удяляем пост с бд
-        Post.objects.filter(text='cache_post_test').delete()
-        # убеждаемся что пост удален
-        self.assertEqual(Post.objects.count(), 0)
-        # снова делам запрос к index
+        # меняем текст в обход сигналов - версия ленты не меняется
+        Post.objects.filter(pk=self.post.pk).update(
+            text='changed_silently', excerpt='changed_silently')
         response = self.guest_client.get(
             reverse('posts:index')
         )
@@ -50,10 +65,364 @@ class CachePageTests(TestCase):
         self.assertContains(response, 'cache_post_test')
         # удаляем кэш
         cache.clear()
-        # снова делаем запрос после удаления кэша
-        # снова делам запрос к index
         response = self.guest_client.get(
             reverse('posts:index')
         )
-        # Убеждаемся что пост после удаления кэша не появился на странице
+        # после очистки кэша страница собрана заново
         self.assertNotContains(response, 'cache_post_test')
+
+    def test_write_is_visible_at_once(self):
+        """Новый и удаленный пост сразу видны в ленте, несмотря на кэш."""
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.create(author=self.author, text='fresh_post_text')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'fresh_post_text')
+
+        self.post.delete()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'cache_post_test')
+
+    def test_unrelated_feeds_stay_cached(self):
+        """Запись в одну группу не сбрасывает кэш чужих лент."""
+        other_group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.other_group.slug}
+        )
+        group_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug}
+        )
+        self.guest_client.get(other_group_url)
+        self.guest_client.get(group_url)
+        # тихо меняем пост чужой группы, чтобы увидеть, что кэш не сброшен
+        Post.objects.filter(pk=self.other_post.pk).update(
+            text='changed_silently', excerpt='changed_silently'
+        )
+        Post.objects.create(
+            author=self.author, text='group_post_text', group=self.group
+        )
+
+        response = self.guest_client.get(group_url)
+        self.assertContains(response, 'group_post_text')
+        response = self.guest_client.get(other_group_url)
+        self.assertContains(response, 'other_cache_post')
+        self.assertNotContains(response, 'changed_silently')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='CardUser', first_name='Старое', last_name='Имя'
+        )
+        cls.post = Post.objects.create(author=cls.author, text='card_text')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_card_reused_between_feeds(self):
+        """Карточка поста отрисовывается один раз для всех лент."""
+        self.client.get(reverse('posts:index'))
+        # тихо меняем текст и сбрасываем версию ленты новым постом
+        Post.objects.filter(pk=self.post.pk).update(
+            text='silent_text', excerpt='silent_text')
+        Post.objects.create(author=self.author, text='other_card')
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.author})
+        )
+        self.assertContains(response, 'other_card')
+        self.assertContains(response, 'card_text')
+
+    def test_card_invalidated_on_edit(self):
+        """Правка поста сразу меняет его карточку."""
+        self.client.get(reverse('posts:index'))
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'edited_card_text'}
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'edited_card_text')
+
+    def test_card_invalidated_on_author_change(self):
+        """Новое имя автора видно в уже закэшированных карточках."""
+        self.client.get(reverse('posts:index'))
+        self.author.first_name = 'Новое'
+        self.author.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое Имя')
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='PageUser')
+        cls.reader = User.objects.create_user(username='PageReader')
+        cls.post = Post.objects.create(author=cls.author, text='page_text')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_warm_page_needs_no_queries(self):
+        """Повторный запрос анонима отдается из кэша без обращения к БД."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                # первый запрос заводит версии тегов, второй кладет страницу
+                self.client.get(url)
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertContains(response, 'page_text')
+
+    def test_write_purges_tagged_pages(self):
+        """Комментарий сразу сбрасывает страницу поста в кэше анонимов."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        self.client.get(url)
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'fresh_comment'}
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.context['post'].comments_count, 1)
+
+    def test_logged_in_users_bypass_page_cache(self):
+        """Страницы с сессией не берутся из кэша анонимов."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.client.get(url)
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'PageReader')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='EtagUser')
+        cls.post = Post.objects.create(author=cls.author, text='etag_text')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_unchanged_pages_return_304(self):
+        """Страница без изменений отвечает 304 по ETag и Last-Modified."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+                response = self.author_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_validators(self):
+        """После комментария страница поста отдается заново."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.author_client.get(url)['ETag']
+        self.author_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'etag_comment'}
+        )
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_commenter_rename_changes_validators(self):
+        """Новое имя комментатора видно без устаревшего 304."""
+        commenter = User.objects.create_user(username='EtagCommenter')
+        Comment.objects.create(
+            post=self.post, author=commenter, text='etag_comment')
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.author_client.get(url)['ETag']
+        commenter.first_name = 'Переименован'
+        commenter.save()
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_validators_differ_between_readers(self):
+        """Гость и автор не получают один и тот же ETag."""
+        url = reverse('posts:index')
+        etag = self.author_client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_relogin_changes_validators(self):
+        """После повторного входа страница с формой отдается заново."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        client = Client()
+        client.force_login(self.author)
+        etag = client.get(url)['ETag']
+        client.logout()
+        client.force_login(self.author)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def slow_compute(self):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return 'value'
+
+    def run_concurrently(self, func, count=8):
+        barrier = threading.Barrier(count)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(func())
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи пересчитывают значение один раз."""
+        results = self.run_concurrently(
+            lambda: single_flight.fetch('key', self.slow_compute, 60))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [('value', True)] * 8)
+
+    def test_decorator_computes_once(self):
+        """Декоратор тоже пересчитывает значение один раз."""
+        cached = single_flight.single_flight(60, lambda: 'key')(
+            self.slow_compute)
+        results = self.run_concurrently(cached)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['value'] * 8)
+
+    def test_stale_value_served_during_recompute(self):
+        """Пока идет пересчет, остальные получают прежнее значение."""
+        single_flight.fetch('key', lambda: 'old', 60, version=1)
+        results = self.run_concurrently(
+            lambda: single_flight.fetch(
+                'key', self.slow_compute, 60, version=2))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results.count(('value', True)), 1)
+        self.assertEqual(results.count(('old', False)), 7)
+
+    def test_early_refresh(self):
+        """Близкое к истечению значение пересчитывается заранее."""
+        def compute_old():
+            # ранний пересчет пропорционален времени пересчета: оно не ноль
+            time.sleep(0.01)
+            return 'old'
+
+        single_flight.fetch('key', compute_old, 60)
+        value, fresh = single_flight.fetch(
+            'key', lambda: 'new', 60, beta=10 ** 9)
+        self.assertEqual(value, 'new')
+        value, fresh = single_flight.fetch('key', lambda: 'newer', 60)
+        self.assertEqual(value, 'new')
+
+    def test_stale_page_not_cached(self):
+        """Страница с устаревшим фрагментом уходит без ETag и не кэшируется."""
+        author = User.objects.create_user(username='FlightUser')
+        Post.objects.create(author=author, text='old_flight_text')
+        url = reverse('posts:index')
+        key = make_template_fragment_key(
+            'index_page', [self.client.get(url).wsgi_request])
+        Post.objects.create(author=author, text='new_flight_text')
+        # фрагмент ленты прямо сейчас пересобирает другой запрос
+        cache.set(single_flight.LOCK_KEY.format(key), 1)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'new_flight_text')
+        self.assertFalse(response.has_header('ETag'))
+        cache.delete(single_flight.LOCK_KEY.format(key))
+        response = self.client.get(url)
+        self.assertContains(response, 'new_flight_text')
+
+
+class LookupCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='LookupUser')
+        cls.group = Group.objects.create(
+            title='lookup_title', slug='lookup_slug', description='text')
+
+    def setUp(self):
+        cache.clear()
+        lookups.groups.clear()
+        lookups.authors.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def group_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.author_client.get(url)
+        return [query['sql'] for query in queries
+                if 'FROM "posts_group"' in query['sql']]
+
+    def test_group_resolved_from_local_tier(self):
+        """Повторный запрос находит группу без обращения к БД."""
+        url = reverse('posts:group_list', kwargs={'slug': 'lookup_slug'})
+        self.assertEqual(len(self.group_queries(url)), 1)
+        hits = lookups.groups.stats['local_hits']
+        self.assertEqual(self.group_queries(url), [])
+        self.assertGreater(lookups.groups.stats['local_hits'], hits)
+
+    def test_shared_tier_after_local_miss(self):
+        """Другой процесс (пустой локальный уровень) берет общий кэш."""
+        url = reverse('posts:profile', kwargs={'username': 'LookupUser'})
+        self.author_client.get(url)
+        lookups.authors.clear()
+        hits = lookups.authors.stats['shared_hits']
+        response = self.author_client.get(url)
+        self.assertEqual(response.context['author'], self.author)
+        self.assertGreater(lookups.authors.stats['shared_hits'], hits)
+
+    def test_stats_logged(self):
+        """Счетчики уровней кэша видны в логе."""
+        cache.clear()
+        tier = lookups.TwoTierCache('test_tier', report_every=0)
+        with self.assertLogs('posts.lookups', 'INFO') as logs:
+            tier.get('key', lambda: 'value')
+            tier.get('key', lambda: 'value')
+        self.assertIn(
+            'Кэш test_tier: в процессе 1 попаданий, 1 промахов; '
+            'общий 0 попаданий, 1 промахов', logs.output[-1])
+
+    def test_rename_invalidates(self):
+        """После смены адреса старый дает 404, новый открывается."""
+        old_url = reverse('posts:group_list', kwargs={'slug': 'lookup_slug'})
+        self.author_client.get(old_url)
+        self.group.slug = 'renamed_slug'
+        self.group.save()
+        self.assertEqual(self.author_client.get(old_url).status_code, 404)
+        response = self.author_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'renamed_slug'}))
+        self.assertEqual(response.context['group'], self.group)
+
+    def test_local_tier_is_bounded(self):
+        """Локальный уровень вытесняет давно не читанные записи."""
+        tier = lookups.TwoTierCache('test_lru', size=2)
+        for key in ('a', 'b', 'c'):
+            tier.get(key, lambda: key.upper())
+        self.assertEqual(list(tier._local), ['b', 'c'])
@@ -0,0 +1,134 @@
+# Сжатие длинных текстов постов и комментариев
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import compression
+from posts.models import Comment, Post, TextDictionary
+from posts.search import search_posts
+
+User = get_user_model()
+
+LONG_TEXT = ' '.join(
+    f'Длинный пост номер {number} про котиков и собак.'
+    for number in range(100)
+) + ' Последнее слово: жирафы.'
+
+
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='ZipAuthor')
+
+    def setUp(self):
+        compression.forget()
+        self.post = Post.objects.create(author=self.author, text=LONG_TEXT)
+
+    def stored(self, model, pk):
+        return model.objects.values_list('text', 'text_z').get(pk=pk)
+
+    def test_round_trip(self):
+        packed = compression.compress(LONG_TEXT)
+        self.assertLess(len(packed), len(LONG_TEXT.encode()) / 3)
+        self.assertEqual(compression.decompress(packed), LONG_TEXT)
+        self.assertIsNone(compression.compress('Короткий пост'))
+
+    def test_dictionary_helps(self):
+        current = (1, compression.train([LONG_TEXT] * 3))
+        compression.remember(*current)
+        plain = compression.compress(LONG_TEXT, (0, b''))
+        packed = compression.compress(LONG_TEXT, current)
+        self.assertLess(len(packed), len(plain))
+        self.assertEqual(compression.decompress(packed), LONG_TEXT)
+
+    def test_long_text_stored_compressed(self):
+        text, packed = self.stored(Post, self.post.pk)
+        self.assertEqual(text, '')
+        self.assertIsNotNone(packed)
+        short = Post.objects.create(author=self.author, text='Короткий')
+        self.assertEqual(self.stored(Post, short.pk), ('Короткий', None))
+
+    def test_decompressed_lazily_without_queries(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIn('text', post.get_deferred_fields())
+        with self.assertNumQueries(0):
+            self.assertEqual(post.text, LONG_TEXT)
+        deferred = Post.objects.for_cards().get(pk=self.post.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(deferred.text, LONG_TEXT)
+        self.assertEqual(str(deferred), LONG_TEXT[:15])
+
+    def test_edit_to_short_text(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Стало коротко'
+        post.save(update_fields=['text'])
+        self.assertEqual(self.stored(Post, post.pk), ('Стало коротко', None))
+        self.assertEqual(Post.objects.get(pk=post.pk).excerpt, 'Стало коротко')
+
+    def test_untouched_text_kept_on_save(self):
+        """Сохранение без обращения к тексту не теряет сжатый текст."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.comments_count = 5
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).text, LONG_TEXT)
+
+    def test_search_finds_compressed_text(self):
+        self.assertEqual(
+            [post.pk for post in search_posts('жирафы')], [self.post.pk])
+        with mock.patch('posts.search.fts_available', return_value=False):
+            self.assertEqual(
+                [post.pk for post in search_posts('жирафы')], [self.post.pk])
+        self.post.delete()
+        self.assertEqual(search_posts('жирафы'), [])
+
+    def test_compressed_comment_shown(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text=LONG_TEXT)
+        self.assertEqual(self.stored(Comment, comment.pk)[0], '')
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertContains(response, 'жирафы', count=2)
+
+    def test_lookups_go_through_body(self):
+        """Фильтр по text сжатый текст не видит, по body() - видит."""
+        self.assertFalse(Post.objects.filter(text__contains='жирафы'))
+        self.assertEqual(
+            list(Post.objects.annotate(body=compression.body()).filter(
+                body__contains='жирафы').values_list('pk', flat=True)),
+            [self.post.pk])
+
+    def test_admin_finds_compressed_comment(self):
+        """Поиск комментариев в админке находит сжатый текст."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text=LONG_TEXT)
+        admin = User.objects.create_superuser(
+            'ZipAdmin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'жирафы'})
+        self.assertEqual(
+            [found.pk for found in response.context['cl'].result_list],
+            [comment.pk])
+
+    def test_compress_texts_command(self):
+        """Новый словарь обучается, и тексты пересжимаются им."""
+        out = StringIO()
+        call_command('compress_texts', '--train', stdout=out)
+        dictionary = TextDictionary.objects.get()
+        self.assertIn(f'Словарь {dictionary.pk}', out.getvalue())
+        self.assertIn('Постов пересжато: 1', out.getvalue())
+        packed = self.stored(Post, self.post.pk)[1]
+        self.assertEqual(
+            compression.HEADER.unpack_from(packed), (dictionary.pk,))
+        compression.forget()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).text, LONG_TEXT)
+        # словарь для триггера индекса читается из базы прямо внутри SQL
+        compression.forget()
+        self.assertEqual(len(search_posts('жирафы')), 1)
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(search_posts('жирафы'), [])
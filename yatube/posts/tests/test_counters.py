@@ -0,0 +1,113 @@
+# Тесты денормализованных счетчиков
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='CountAuthor')
+        cls.reader = User.objects.create_user(username='CountReader')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Создание и удаление постов и комментариев меняют счетчики."""
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Считаем посты'}
+        )
+        post = Post.objects.get(text='Считаем посты')
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        Comment.objects.filter(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счетчики обеих сторон."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_profile_and_post_render_without_aggregates(self):
+        """Профиль и пост показывают счетчики без COUNT(*)."""
+        post = Post.objects.create(author=self.author, text='Без агрегатов')
+        Follow.objects.create(author=self.author, user=self.reader)
+        for url in (
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.reader_client.get(url)
+                for query in queries.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+
+    def test_user_without_stats_row(self):
+        """
+        У пользователя из bulk_create нет строки счетчиков: страница поста
+        открывается, а первая запись заводит строку с верными значениями.
+        """
+        # bulk_create в SQLite не возвращает pk - перечитываем
+        User.objects.bulk_create([User(username='BulkAuthor')])
+        bulk = User.objects.get(username='BulkAuthor')
+        Post.objects.bulk_create([Post(author=bulk, text='Из фикстуры')])
+        post = Post.objects.get(author=bulk)
+        response = self.reader_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(response.context['count_posts'], 1)
+        Post.objects.create(author=bulk, text='Новый пост')
+        Follow.objects.create(author=bulk, user=self.reader)
+        stats = self.stats(bulk)
+        self.assertEqual(stats.posts_count, 2)
+        self.assertEqual(stats.followers_count, 1)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount чинит разошедшиеся счетчики."""
+        post = Post.objects.create(author=self.author, text='Дрейф')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=42)
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        AuthorStats.objects.filter(user=self.reader).delete()
+
+        call_command('recount', stdout=StringIO())
+
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
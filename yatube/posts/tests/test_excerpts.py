@@ -0,0 +1,93 @@
+# Начало текста в карточках лент
+from importlib import import_module
+from io import StringIO
+
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.feed_cache import get_versions
+from posts.models import Post, make_excerpt
+
+User = get_user_model()
+
+LONG_TEXT = ' '.join(['слово'] * 100) + ' конец_текста'
+
+
+class MakeExcerptTests(TestCase):
+    def test_short_text_unchanged(self):
+        self.assertEqual(make_excerpt('  Короткий пост '), 'Короткий пост')
+
+    def test_cut_on_word_boundary(self):
+        self.assertEqual(make_excerpt('один два три', 6), 'один…')
+        self.assertEqual(make_excerpt('один два три', 8), 'один два…')
+        self.assertEqual(make_excerpt('одно_длинное_слово', 4), 'одно…')
+
+    def test_first_paragraph(self):
+        self.assertEqual(
+            make_excerpt('Первый абзац.\n\nВторой абзац.'), 'Первый абзац.…')
+
+
+class ExcerptTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='ExcerptUser')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(author=self.author, text=LONG_TEXT)
+
+    def test_excerpt_maintained_on_save(self):
+        self.assertTrue(self.post.excerpt_truncated)
+        self.assertNotIn('конец_текста', self.post.excerpt)
+        self.post.text = 'Новый текст'
+        self.post.save(update_fields=['text'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.excerpt, 'Новый текст')
+        self.assertFalse(self.post.excerpt_truncated)
+
+    def test_feed_shows_excerpt_without_text(self):
+        """Лента не читает полный текст и ведет на страницу поста."""
+        response = self.client.get(reverse('posts:index'))
+        post = response.context['page_obj'][0]
+        self.assertIn('text', post.get_deferred_fields())
+        self.assertNotContains(response, 'конец_текста')
+        self.assertContains(response, 'Читать дальше')
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertContains(response, 'конец_текста')
+
+    def test_fill_excerpts_command(self):
+        Post.objects.update(excerpt='')
+        Post.objects.create(author=self.author, text='второй пост')
+        scopes = ('index', f'author:{self.author.pk}', f'post:{self.post.pk}')
+        versions = get_versions(*scopes)
+        out = StringIO()
+        call_command('fill_excerpts', '--batch-size', '1', stdout=out)
+        # закэшированные ленты и страница поста собираются заново
+        for scope, old, new in zip(scopes, versions, get_versions(*scopes)):
+            with self.subTest(scope=scope):
+                self.assertNotEqual(old, new)
+        self.assertIn('[2/2] обновлено: 0', out.getvalue())
+        self.assertIn('Постов: 2, обновлено: 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.excerpt, make_excerpt(LONG_TEXT))
+
+    def test_migration_fills_excerpts(self):
+        """Карточки не пустые и до запуска fill_excerpts."""
+        migration = import_module('posts.migrations.0019_post_excerpt')
+        # короткий текст: до 0020 тексты хранятся несжатыми
+        post = Post.objects.create(
+            author=self.author, text='Первый абзац.\n\nВторой абзац.')
+        Post.objects.update(excerpt='')
+        state = MigrationLoader(connection).project_state(
+            ('posts', '0019_post_excerpt'))
+        migration.fill_excerpts(state.apps, None)
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'Первый абзац.…')
@@ -1,5 +1,7 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from posts.models import Post, Follow
+from posts.models import Post, Follow, TimelineEntry
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.core.cache import cache
@@ -84,3 +86,68 @@ class FollowPostTest(TestCase):
             author=self.test_user_1,
             user=self.test_user_3).exists()
         )
+
+    def test_timeline_fan_out_on_new_post(self):
+        """Новый пост сразу попадает в готовую ленту подписчика."""
+        post = Post.objects.create(
+            author=self.test_user_1,
+            text='Пост для ленты'
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.test_user_2, post=post).exists()
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.test_user_3, post=post).exists()
+        )
+        post.delete()
+        self.assertFalse(TimelineEntry.objects.filter(post=post.pk).exists())
+
+    def test_timeline_backfill_and_cleanup(self):
+        """Подписка добавляет старые посты в ленту, отписка убирает."""
+        follow = Follow.objects.create(
+            author=self.test_user_1,
+            user=self.test_user_3
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.test_user_3, post=self.post).exists()
+        )
+        follow.delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.test_user_3).exists()
+        )
+
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        with mock.patch('posts.timeline.FANOUT_LIMIT', 0):
+            post = Post.objects.create(
+                author=self.test_user_1,
+                text='Пост популярного автора'
+            )
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=post).exists()
+            )
+            cache.clear()
+            response = self.test_user_mike.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост популярного автора')
+
+    def test_celebrity_decided_by_followers_count(self):
+        """Раскладка и чтение ленты считают популярность одинаково."""
+        with mock.patch('posts.timeline.FANOUT_LIMIT', 1):
+            follow = Follow.objects.create(
+                author=self.test_user_1, user=self.test_user_3)
+            post = Post.objects.create(
+                author=self.test_user_1,
+                text='Пост популярного автора'
+            )
+            # подписчиков больше предела - в готовую ленту не попадает
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=post).exists()
+            )
+            follow.delete()
+        # автор снова обычный - пропущенный пост разложен по лентам
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.test_user_2, post=post).exists()
+        )
+        cache.clear()
+        response = self.test_user_mike.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост популярного автора')
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -7,6 +8,8 @@ from django.test import Client, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from posts.models import Post, Group, Comment
 from posts.forms import PostForm, CommentForm
+from posts.storage import content_name
+from posts.uploads import reencode
 from django.conf import settings
 
 User = get_user_model()
@@ -24,7 +27,7 @@ class PostFormTests(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.author = User.objects.create_user(username='UserName')
-        small_gif = (
+        cls.small_gif = small_gif = (
             b'\x47\x49\x46\x38\x39\x61\x02\x00'
             b'\x01\x00\x80\x00\x00\x00\x00\x00'
             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
@@ -94,12 +97,18 @@ class PostFormTests(TestCase):
         )
         # Проверяем, увеличилось ли число постов
         self.assertEqual(Post.objects.count(), post_count + 1)
+        reencoded = reencode(SimpleUploadedFile(
+            'small.gif', self.small_gif, 'image/gif'))
         # Проверяем, что создалась запись
         self.assertTrue(Post.objects.filter(
             author=self.author,
             group=self.group,
             text='New Тестовый текст',
-            image='posts/small.gif').exists()
+            # картинка перекодирована (posts/uploads.py) и названа хешем
+            # содержимого (posts/storage.py)
+            image=content_name(
+                'posts/small.jpg',
+                hashlib.sha256(reencoded.read()).hexdigest())).exists()
         )
 
 
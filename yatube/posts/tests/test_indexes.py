@@ -0,0 +1,86 @@
+# Проверяем, что каждая лента читается по индексу
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post
+from posts.paginator import KeysetPaginator
+from posts.timeline import follow_feed
+from posts.views import comment_page
+
+User = get_user_model()
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='PlanAuthor')
+        cls.reader = User.objects.create_user(username='PlanReader')
+        cls.group = Group.objects.create(
+            title='plan_title',
+            slug='plan_slug',
+            description='plan_description'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='plan_post',
+            group=cls.group
+        )
+        Follow.objects.create(author=cls.author, user=cls.reader)
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, name, queryset):
+        plan = self.query_plan(queryset)
+        for step in plan:
+            with self.subTest(query=name, step=step):
+                self.assertNotIn('TEMP B-TREE', step)
+                if step.startswith('SCAN'):
+                    self.assertIn('INDEX', step)
+
+    def test_feeds_use_indexes(self):
+        """Ленты читаются по индексу без полного прохода и сортировки."""
+        feeds = {
+            'index': Post.objects.for_cards(),
+            'group_list': self.group.group_list.all(),
+            'profile': Post.objects.filter(author=self.author),
+            'follow_index': follow_feed(self.reader),
+        }
+        for name, queryset in feeds.items():
+            paginator = KeysetPaginator(queryset, 10)
+            first_page = paginator.object_list[:11]
+            self.assert_indexed(name, first_page)
+            values = paginator.decode_cursor(
+                paginator.encode_cursor(first_page[0])
+            )
+            next_page = paginator.object_list.filter(
+                paginator._seek(values, forward=True)
+            )[:11]
+            self.assert_indexed(name + ' ?after=', next_page)
+
+    def test_comment_stream_uses_index(self):
+        """Порции комментариев читаются по индексу (post, created)."""
+        Comment.objects.create(post=self.post, author=self.reader, text='c')
+        page = comment_page(self.post.pk)
+        paginator = page.paginator
+        self.assert_indexed('comments', paginator.object_list[:21])
+        values = paginator.decode_cursor(paginator.encode_cursor(page[0]))
+        self.assert_indexed('comments ?after=', paginator.object_list.filter(
+            paginator._seek(values, forward=True))[:21])
+
+    def test_lookups_use_indexes(self):
+        """Комментарии поста и подписки находятся по индексу."""
+        lookups = {
+            'comments': Comment.objects.filter(post=self.post),
+            'follow': Follow.objects.filter(
+                author=self.author, user=self.reader
+            ),
+            'followers': Follow.objects.filter(author=self.author),
+        }
+        for name, queryset in lookups.items():
+            self.assert_indexed(name, queryset)
@@ -0,0 +1,149 @@
+# Сборщик осиротевших картинок и миниатюр
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import media_gc, thumbnails
+from posts.constants import THUMBNAILS
+from posts.models import MediaFile, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\xFF\x00\xFF', 1)
+
+
+class BloomFilterTests(TestCase):
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = media_gc.BloomFilter(1000, 0.01)
+        for number in range(1000):
+            bloom.add(f'posts/{number}.jpg')
+        for number in range(1000):
+            self.assertIn(f'posts/{number}.jpg', bloom)
+        false_positives = sum(
+            f'cache/{number}.jpg' in bloom for number in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_positions_do_not_repeat(self):
+        """Каждое имя ставит ровно hashes разных битов при любом размере."""
+        for capacity in (7, 42, 1000):
+            bloom = media_gc.BloomFilter(capacity, 0.001)
+            for number in range(1000):
+                positions = list(bloom._positions(f'cache/{number}.webp'))
+                self.assertEqual(len(set(positions)), bloom.hashes)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaCollectorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='GarbageUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        for directory in os.listdir(TEMP_MEDIA_ROOT):
+            shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, directory),
+                          ignore_errors=True)
+        cache.clear()
+        self.live = self.create_post('live', SMALL_GIF)
+        orphan = self.create_post('orphan', OTHER_GIF)
+        self.orphan_name = orphan.image.name
+        orphan.delete()
+        self.age_files()
+
+    def create_post(self, text, content):
+        post = Post.objects.create(
+            author=self.author, text=text,
+            image=SimpleUploadedFile(f'{text}.gif', content, 'image/gif'))
+        thumbnails.generate(post.image.name)
+        return post
+
+    def age_files(self, age=2 * 24 * 60 * 60):
+        past = time.time() - age
+        for name in self.files():
+            os.utime(os.path.join(TEMP_MEDIA_ROOT, name), (past, past))
+
+    def files(self):
+        return [name for name, stat in media_gc.walk()]
+
+    def test_orphans_deleted_live_kept(self):
+        """Картинка удаленного поста уходит вместе с миниатюрами."""
+        self.assertEqual(len(self.files()), 2 * (len(THUMBNAILS) + 1))
+        stats, cursor = media_gc.collect()
+        self.assertIsNone(cursor)
+        self.assertEqual(stats['deleted'], len(THUMBNAILS) + 1)
+        self.assertFalse(default_storage.exists(self.orphan_name))
+        self.assertFalse(MediaFile.objects.filter(
+            name=self.orphan_name).exists())
+        remaining = self.files()
+        self.assertEqual(len(remaining), len(THUMBNAILS) + 1)
+        self.assertIn(self.live.image.name, remaining)
+
+    def test_grace_period(self):
+        """Свежие файлы не трогаются, даже если на них никто не ссылается."""
+        fresh = default_storage.save(
+            'posts/fresh.gif', ContentFile(b'fresh'))
+        media_gc.collect()
+        self.assertTrue(default_storage.exists(fresh))
+        self.assertFalse(default_storage.exists(self.orphan_name))
+
+    def test_dry_run(self):
+        stats, cursor = media_gc.collect(dry_run=True)
+        self.assertEqual(stats['deleted'], len(THUMBNAILS) + 1)
+        self.assertTrue(default_storage.exists(self.orphan_name))
+
+    def test_resumable(self):
+        """Обход по частям проходит все файлы ровно один раз."""
+        total = len(self.files())
+        checked, cursor, runs = 0, None, 0
+        while True:
+            stats, cursor = media_gc.collect(after=cursor, limit=3)
+            checked += stats['checked']
+            runs += 1
+            if cursor is None:
+                break
+        self.assertEqual(checked, total)
+        self.assertGreater(runs, 1)
+        self.assertFalse(default_storage.exists(self.orphan_name))
+
+    def test_reference_after_filter_is_kept(self):
+        """Файл, на который сослались после сборки фильтра, остается."""
+        live = media_gc.referenced()
+        Post.objects.create(
+            author=self.author, text='late', image=self.orphan_name)
+        media_gc.collect(live=live)
+        self.assertTrue(default_storage.exists(self.orphan_name))
+
+    def test_command_saves_cursor(self):
+        out = StringIO()
+        call_command('media_gc', '--limit', '2', stdout=out)
+        self.assertIn('Проверено: 2', out.getvalue())
+        self.assertIn('продолжение после', out.getvalue())
+        out = StringIO()
+        call_command('media_gc', stdout=out)
+        self.assertIn('обход завершен', out.getvalue())
+        self.assertFalse(default_storage.exists(self.orphan_name))
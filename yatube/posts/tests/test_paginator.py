@@ -0,0 +1,98 @@
+# Число постов для ?page=N и окно номеров страниц
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import feed_counts
+from posts.models import AuthorStats, Group, Post
+from posts.paginator import KeysetPaginator
+
+User = get_user_model()
+
+POSTS = 30
+
+
+class PageWindowTests(TestCase):
+    def window(self, number, pages):
+        paginator = KeysetPaginator(
+            Post.objects.all(), 10, count=lambda: pages * 10)
+        return list(paginator.get_elided_page_range(number))
+
+    def test_short_range_unchanged(self):
+        self.assertEqual(self.window(3, 6), [1, 2, 3, 4, 5, 6])
+
+    def test_window_with_ellipses(self):
+        self.assertEqual(
+            self.window(25, 50), [1, '…', 23, 24, 25, 26, 27, '…', 50])
+        self.assertEqual(self.window(1, 50), [1, 2, 3, '…', 50])
+        self.assertEqual(self.window(50, 50), [1, '…', 48, 49, 50])
+        self.assertEqual(self.window(4, 50), [1, 2, 3, 4, 5, 6, '…', 50])
+
+
+class FeedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='PageAuthor')
+        cls.group = Group.objects.create(
+            title='page_title', slug='page_slug', description='text')
+        start = timezone.now() - timedelta(hours=POSTS)
+        for number in range(POSTS):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'post_{number}')
+            # посты идут ровно раз в час
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=start + timedelta(hours=number))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_small_feed_counted_exactly_once(self):
+        """Малая лента считается точно, повтор берется из кэша."""
+        queryset = Post.objects.all()
+        self.assertEqual(feed_counts.feed_count('index', queryset), POSTS)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                feed_counts.feed_count('index', queryset), POSTS)
+
+    def test_new_post_invalidates_exact_count(self):
+        queryset = Post.objects.all()
+        feed_counts.feed_count('index', queryset)
+        Post.objects.create(author=self.author, text='new')
+        self.assertEqual(
+            feed_counts.feed_count('index', queryset), POSTS + 1)
+
+    def test_large_feed_estimated(self):
+        """Большая лента оценивается по частоте последних постов."""
+        with mock.patch('posts.constants.FEED_COUNT_EXACT_LIMIT', 10), \
+                self.assertNumQueries(4):
+            total = feed_counts.count(Post.objects.all())
+        self.assertTrue(total.estimated)
+        self.assertEqual(total, POSTS)
+
+    def test_page_navigation_without_full_count(self):
+        """?page=N берет оценку, в навигации - окно номеров."""
+        with mock.patch('posts.constants.FEED_COUNT_EXACT_LIMIT', 10):
+            response = self.client.get(
+                reverse('posts:group_list', kwargs={'slug': 'page_slug'})
+                + '?page=2')
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.paginator.estimated)
+        self.assertEqual(page_obj.paginator.num_pages, 3)
+        self.assertContains(response, '(≈3)')
+
+    def test_profile_count_from_counter(self):
+        """Профиль берет число постов из AuthorStats, а не COUNT(*)."""
+        AuthorStats.objects.filter(user=self.author).update(posts_count=500)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'PageAuthor'})
+            + '?page=3')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.num_pages, 50)
+        self.assertEqual(
+            page_obj.page_window, [1, 2, 3, 4, 5, '…', 50])
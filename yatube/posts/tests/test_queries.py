@@ -0,0 +1,120 @@
+# Бюджет запросов к БД для каждого адреса posts/urls.py.
+# Число запросов не должно зависеть от числа постов на странице.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import lookups, search
+from posts.constants import PUB_VALUE
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# сессия и пользователь авторизованного клиента стоят двух запросов
+SESSION_QUERIES = 2
+GUEST_BUDGETS = {
+    'posts:index': 1,
+    'posts:group_list': 2,
+    'posts:profile': 3,
+    'posts:post_detail': 3,
+    'posts:post_comments': 3,
+    'posts:search': 3,
+}
+USER_BUDGETS = {
+    'posts:index': 1,
+    'posts:group_list': 2,
+    'posts:profile': 4,
+    'posts:post_detail': 3,
+    'posts:post_comments': 3,
+    'posts:follow_index': 2,
+    'posts:post_create': 1,
+    'posts:post_edit': 2,
+}
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        lookups.groups.clear()
+        lookups.authors.clear()
+        # наличие FTS5 проверяется один раз на процесс
+        search.fts_available()
+        self.author = User.objects.create_user(username='BudgetAuthor')
+        self.reader = User.objects.create_user(username='BudgetReader')
+        self.group = Group.objects.create(
+            title='budget_title', slug='budget_slug', description='text')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def create_posts(self, count):
+        for number in range(count):
+            self.post = Post.objects.create(
+                author=self.author, group=self.group, text=f'post_{number}')
+            Comment.objects.create(
+                post=self.post, author=self.reader, text=f'comment_{number}')
+
+    def urls(self):
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': self.author.username}),
+            'posts:post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}),
+            'posts:post_comments': reverse(
+                'posts:post_comments', kwargs={'post_id': self.post.pk}),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:search': reverse('posts:search') + '?q=post',
+            'posts:post_create': reverse('posts:post_create'),
+            'posts:post_edit': reverse(
+                'posts:post_edit', kwargs={'post_id': self.post.pk}),
+        }
+
+    def assert_budget(self, client, name, url, budget):
+        # холодный кэш - самый дорогой путь
+        cache.clear()
+        lookups.groups.clear()
+        lookups.authors.clear()
+        with self.subTest(url=name), self.assertNumQueries(budget):
+            client.get(url)
+
+    def check_budgets(self, count):
+        self.create_posts(count)
+        urls = self.urls()
+        for name, budget in GUEST_BUDGETS.items():
+            self.assert_budget(self.client, name, urls[name], budget)
+        for name, budget in USER_BUDGETS.items():
+            client = (
+                self.author_client if name == 'posts:post_edit'
+                else self.reader_client
+            )
+            self.assert_budget(
+                client, name, urls[name], budget + SESSION_QUERIES)
+
+    def test_budgets_with_one_post(self):
+        self.check_budgets(1)
+
+    def test_budgets_with_full_page(self):
+        self.check_budgets(PUB_VALUE)
+
+    def test_write_budgets(self):
+        """Подписка, отписка и комментарий укладываются в бюджет."""
+        self.create_posts(PUB_VALUE)
+        other = User.objects.create_user(username='BudgetOther')
+        writes = (
+            ('follow', 'posts:profile_follow', {'username': other}, 9),
+            # отписка в своей транзакции записи: точка сохранения;
+            # и проверка, не перестал ли автор быть популярным
+            ('unfollow', 'posts:profile_unfollow', {'username': other}, 8),
+            ('comment', 'posts:add_comment', {'post_id': self.post.pk}, 5),
+        )
+        for name, url_name, kwargs, budget in writes:
+            with self.subTest(url=name), self.assertNumQueries(
+                    budget + SESSION_QUERIES):
+                self.reader_client.post(
+                    reverse(url_name, kwargs=kwargs), {'text': 'budget'})
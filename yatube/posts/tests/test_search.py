@@ -0,0 +1,88 @@
+# Полнотекстовый поиск по постам
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='SearchAuthor')
+        cls.other_author = User.objects.create_user(username='SearchOther')
+        cls.group = Group.objects.create(
+            title='search_title', slug='search_slug', description='text')
+        cls.rare = Post.objects.create(
+            author=cls.author, text='Котики спят на солнце')
+        cls.frequent = Post.objects.create(
+            author=cls.other_author, group=cls.group,
+            text='Котики, котики и снова котики')
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return [post.pk for post in response.context['results']]
+
+    def test_results_ranked_by_relevance(self):
+        """Пост, где слово встречается чаще, выше в выдаче."""
+        self.assertEqual(
+            self.search(q='котики'), [self.frequent.pk, self.rare.pk])
+
+    def test_prefix_and_all_words(self):
+        """Все слова обязательны, последнее ищется по началу."""
+        self.assertEqual(self.search(q='котики солн'), [self.rare.pk])
+
+    def test_filters(self):
+        self.assertEqual(
+            self.search(q='котики', group='search_slug'), [self.frequent.pk])
+        self.assertEqual(
+            self.search(q='котики', author='SearchAuthor'), [self.rare.pk])
+
+    def test_index_follows_edits(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        post = Post.objects.get(pk=self.rare.pk)
+        post.text = 'Собаки гуляют'
+        post.save()
+        self.assertEqual(self.search(q='собаки'), [post.pk])
+        self.assertEqual(self.search(q='солнце'), [])
+        post.delete()
+        self.assertEqual(self.search(q='собаки'), [])
+
+    def test_snippet_is_escaped(self):
+        """Текст поста экранируется, выделение слов остается разметкой."""
+        Post.objects.create(
+            author=self.author, text='<script>alert(1)</script> попугай')
+        response = self.client.get(reverse('posts:search'), {'q': 'попугай'})
+        self.assertContains(response, '&lt;script&gt;')
+        self.assertContains(response, '<mark>попугай</mark>')
+        self.assertNotContains(response, '<script>alert')
+
+    def test_query_syntax_is_not_interpreted(self):
+        """Кавычки и операторы FTS5 в запросе не ломают поиск."""
+        for query in ('"', 'котики OR', 'NEAR(котики', '*', 'котики"'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    def test_like_fallback(self):
+        """Без FTS5 поиск работает через LIKE."""
+        with mock.patch('posts.search.fts_available', return_value=False):
+            self.assertEqual(self.search(q='солнце'), [self.rare.pk])
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser(
+            username='SearchAdmin', email='admin@example.com',
+            password='password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'солнце'})
+        self.assertEqual(
+            [post.pk for post in response.context['cl'].result_list],
+            [self.rare.pk]
+        )
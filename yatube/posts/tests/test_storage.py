@@ -0,0 +1,148 @@
+# Хранилище картинок по содержимому и счетчики ссылок на файлы
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.feed_cache import get_versions
+from posts.models import MediaFile, Post
+from posts.storage import content_name, is_content_addressed
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+# та же картинка, но другой байт палитры - другое содержимое
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\xFF\x00\xFF', 1)
+
+
+def gif(name, content=SMALL_GIF):
+    return SimpleUploadedFile(name, content, 'image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='StorageUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'posts'),
+                      ignore_errors=True)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def files(self):
+        found = []
+        for root, dirs, files in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'posts')):
+            found += [os.path.join(root, name) for name in files]
+        return found
+
+    def refs(self, name):
+        return MediaFile.objects.get(name=name).refs
+
+    def test_sharded_name(self):
+        """Файл называется хешем содержимого и лежит в двух шардах."""
+        post = Post.objects.create(
+            author=self.author, text='shard', image=gif('Meme.GIF'))
+        sha = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(
+            post.image.name, f'posts/{sha[:2]}/{sha[2:4]}/{sha}.gif')
+        self.assertTrue(is_content_addressed(post.image.name))
+        self.assertFalse(is_content_addressed('posts/small.gif'))
+        with open(post.image.path, 'rb') as stored:
+            self.assertEqual(stored.read(), SMALL_GIF)
+
+    def test_same_content_stored_once(self):
+        """Одна картинка, загруженная дважды, хранится одним файлом."""
+        for number in range(2):
+            self.author_client.post(reverse('posts:post_create'), {
+                'text': f'dedup_{number}', 'image': gif(f'{number}.gif')})
+        first, second = Post.objects.filter(text__startswith='dedup_')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(len(self.files()), 1)
+        self.assertEqual(self.refs(first.image.name), 2)
+
+    def test_references_follow_edits_and_deletes(self):
+        """Замена картинки и удаление поста снимают ссылку на файл."""
+        post = Post.objects.create(
+            author=self.author, text='refs', image=gif('refs.gif'))
+        Post.objects.create(
+            author=self.author, text='refs_2', image=gif('refs_2.gif'))
+        old_name = post.image.name
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'refs', 'image': gif('new.gif', OTHER_GIF)})
+        post.refresh_from_db()
+        self.assertEqual(self.refs(old_name), 1)
+        self.assertEqual(self.refs(post.image.name), 1)
+        post.delete()
+        self.assertEqual(self.refs(post.image.name), 0)
+
+    def test_recount_repairs_references(self):
+        post = Post.objects.create(
+            author=self.author, text='drift', image=gif('drift.gif'))
+        MediaFile.objects.filter(name=post.image.name).update(refs=5)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.refs(post.image.name), 1)
+
+    def test_rehash_command(self):
+        """Команда переносит старые плоские пути и сводит дубликаты."""
+        legacy = FileSystemStorage()
+        for name in ('posts/a.gif', 'posts/b.gif'):
+            legacy.save(name, ContentFile(SMALL_GIF))
+        legacy.save('posts/c.gif', ContentFile(OTHER_GIF))
+        for name in ('posts/a.gif', 'posts/b.gif', 'posts/c.gif',
+                     'posts/lost.gif'):
+            Post.objects.create(author=self.author, text=name, image=name)
+        moved = Post.objects.get(text='posts/c.gif')
+        scopes = ('index', f'author:{self.author.pk}', f'post:{moved.pk}')
+        versions = get_versions(*scopes)
+        out, err = StringIO(), StringIO()
+        call_command('rehash_media', '--batch-size', '2',
+                     stdout=out, stderr=err)
+        # закэшированные ленты и страница поста собираются заново
+        for scope, old, new in zip(scopes, versions, get_versions(*scopes)):
+            with self.subTest(scope=scope):
+                self.assertNotEqual(old, new)
+        self.assertIn('перенесено: 3, одинаковых: 1, не найдено: 1',
+                      out.getvalue())
+        self.assertIn('posts/lost.gif', err.getvalue())
+        expected = {
+            'posts/a.gif': content_name(
+                'posts/a.gif', hashlib.sha256(SMALL_GIF).hexdigest()),
+            'posts/b.gif': content_name(
+                'posts/b.gif', hashlib.sha256(SMALL_GIF).hexdigest()),
+            'posts/c.gif': content_name(
+                'posts/c.gif', hashlib.sha256(OTHER_GIF).hexdigest()),
+            'posts/lost.gif': 'posts/lost.gif',
+        }
+        for text, name in expected.items():
+            with self.subTest(post=text):
+                self.assertEqual(Post.objects.get(text=text).image.name, name)
+        self.assertTrue(default_storage.exists(expected['posts/c.gif']))
+        self.assertEqual(self.refs(expected['posts/a.gif']), 2)
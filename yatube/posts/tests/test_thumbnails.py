@@ -0,0 +1,203 @@
+# Нарезка миниатюр заранее
+import os
+import shutil
+import tempfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.constants import THUMBNAILS
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def run_on_commit(func):
+    # в TestCase транзакция не коммитится - выполняем сразу
+    func()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='ThumbUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # одинаковые картинки - один файл, миниатюры прошлых тестов
+        # не должны находиться ни на диске, ни в кэше sorl
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'cache'),
+                      ignore_errors=True)
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def thumbnail_files(self):
+        found = []
+        for root, dirs, files in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'cache')):
+            found += files
+        return found
+
+    def create_post(self, name='thumb.gif'):
+        return self.author_client.post(reverse('posts:post_create'), {
+            'text': 'thumb_text',
+            'image': SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        })
+
+    def test_upload_schedules_generation(self):
+        """Загрузка картинки ставит нарезку в пул процессов, не режет сама."""
+        pool = mock.Mock()
+        with mock.patch('posts.thumbnails.transaction.on_commit',
+                        run_on_commit), \
+                mock.patch('posts.thumbnails.executor', return_value=pool), \
+                mock.patch('posts.thumbnails.pool_available',
+                           return_value=True):
+            self.create_post()
+        name = Post.objects.get(text='thumb_text').image.name
+        pool.submit.assert_called_once()
+        self.assertEqual(pool.submit.call_args[0][1], name)
+        pool.submit.return_value.add_done_callback.assert_called_once_with(
+            thumbnails.log_failure)
+        self.assertEqual(self.thumbnail_files(), [])
+
+    def test_pool_failure_logged(self):
+        """Ошибка нарезки в пуле не теряется вместе с Future."""
+        future = Future()
+        future.set_exception(OSError('broken image'))
+        with self.assertLogs('posts.thumbnails', 'ERROR') as logs:
+            thumbnails.log_failure(future)
+        self.assertIn('broken image', logs.output[0])
+
+    @mock.patch.dict('posts.thumbnails._executors', clear=True)
+    def test_broken_pool_replaced(self):
+        """Умерший процесс пула не ломает нарезку следующих картинок."""
+        pool = mock.Mock()
+        pool.submit.side_effect = BrokenProcessPool('worker died')
+        with mock.patch('posts.thumbnails.transaction.on_commit',
+                        run_on_commit), \
+                mock.patch('posts.thumbnails.ProcessPoolExecutor',
+                           return_value=pool), \
+                mock.patch('posts.thumbnails.pool_available',
+                           return_value=True), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            self.create_post('broken.gif')
+        # сломанный пул забыт, а картинка нарезана сразу
+        pool.shutdown.assert_called_once_with(wait=False)
+        self.assertEqual(thumbnails._executors, {})
+        self.assertEqual(len(self.thumbnail_files()), len(THUMBNAILS))
+
+    def test_generation_inline(self):
+        """Без процессов пула миниатюры режутся сразу."""
+        with mock.patch('posts.thumbnails.transaction.on_commit',
+                        run_on_commit), \
+                mock.patch('posts.constants.THUMBNAIL_WORKERS', 0):
+            self.assertFalse(thumbnails.pool_available())
+            self.create_post('inline.gif')
+        # каждая ширина - в WebP и в JPEG
+        self.assertEqual(len(self.thumbnail_files()), len(THUMBNAILS))
+        extensions = [
+            os.path.splitext(name)[1] for name in self.thumbnail_files()]
+        self.assertEqual(extensions.count('.webp'), len(THUMBNAILS) // 2)
+        self.assertEqual(extensions.count('.jpg'), len(THUMBNAILS) // 2)
+
+    def test_backfill_command(self):
+        """Команда нарезает миниатюры всех картинок и пишет прогресс."""
+        for number in range(2):
+            Post.objects.create(
+                author=self.author, text=f'backfill_{number}',
+                image=SimpleUploadedFile(
+                    f'backfill_{number}.gif', SMALL_GIF, 'image/gif'))
+        out = StringIO()
+        call_command('thumbnails', '--workers', '0', '--force', stdout=out)
+        # у двух постов одна и та же картинка - она режется один раз
+        self.assertIn('[1/1]', out.getvalue())
+        self.assertIn('с ошибками: 0', out.getvalue())
+        self.assertEqual(len(self.thumbnail_files()), len(THUMBNAILS))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='PrefetchUser')
+        for number in range(5):
+            Post.objects.create(
+                author=cls.author, text=f'prefetch_{number}',
+                image=SimpleUploadedFile(
+                    f'prefetch_{number}.gif', SMALL_GIF, 'image/gif'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.posts = list(Post.objects.all())
+
+    def test_page_resolved_in_one_query(self):
+        """Миниатюры всей страницы находятся одним запросом."""
+        for post in self.posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(self.posts, list(THUMBNAILS))
+        for post in self.posts:
+            for size, (geometry, options) in THUMBNAILS.items():
+                self.assertEqual(
+                    post.thumbnails[size],
+                    thumbnails.get_thumbnail(
+                        post.image.name, geometry, **options).url
+                )
+
+    def test_missing_thumbnails_generated(self):
+        """Картинки без миниатюры получают ее при сборке страницы."""
+        cache.clear()
+        with mock.patch('posts.thumbnails.thumbnail_url',
+                        return_value='/media/generated.jpg') as generate:
+            thumbnails.prefetch(self.posts[:1], ['card-960-jpeg'])
+        generate.assert_called_once()
+        self.assertEqual(
+            self.posts[0].thumbnails['card-960-jpeg'], '/media/generated.jpg')
+
+    def test_responsive_markup(self):
+        """Картинка отдается в WebP и JPEG всех ширин, с размерами."""
+        post = self.posts[0]
+        thumbnails.generate(post.image.name)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'width="960" height="339"')
+        for size, image_format, width, height in thumbnails.variants('card'):
+            geometry, options = THUMBNAILS[size]
+            url = thumbnails.get_thumbnail(
+                post.image.name, geometry, **options).url
+            self.assertContains(response, f'{url} {width}w')
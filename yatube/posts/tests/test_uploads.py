@@ -0,0 +1,118 @@
+# Проверка и перекодирование загружаемых картинок
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+EXIF_ORIENTATION = 0x0112
+EXIF_MAKE = 0x010F
+
+
+def image_file(name, size=(60, 30), mode='RGB', image_format='JPEG',
+               exif=None):
+    output = BytesIO()
+    color = (255, 0, 0, 128) if mode == 'RGBA' else (255, 0, 0)
+    options = {'exif': exif} if exif is not None else {}
+    Image.new(mode, size, color).save(output, image_format, **options)
+    return SimpleUploadedFile(
+        name, output.getvalue(), f'image/{image_format.lower()}')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='UploadUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def upload(self, image):
+        return self.author_client.post(reverse('posts:post_create'), {
+            'text': 'upload_text', 'image': image})
+
+    def stored(self):
+        post = Post.objects.get(text='upload_text')
+        return post.image.name, Image.open(post.image.path)
+
+    def test_reencoded_to_progressive_jpeg(self):
+        """Картинка без прозрачности хранится прогрессивным JPEG."""
+        self.upload(image_file('photo.png', image_format='PNG'))
+        name, image = self.stored()
+        self.assertTrue(name.endswith('.jpg'))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertTrue(image.info.get('progressive'))
+
+    def test_transparency_kept_as_webp(self):
+        self.upload(image_file('logo.png', mode='RGBA', image_format='PNG'))
+        name, image = self.stored()
+        self.assertTrue(name.endswith('.webp'))
+        self.assertEqual(image.mode, 'RGBA')
+
+    def test_downscaled(self):
+        """Большая сторона уменьшается до IMAGE_MAX_SIDE."""
+        with mock.patch('posts.constants.IMAGE_MAX_SIDE', 20):
+            self.upload(image_file('wide.jpg', size=(200, 50)))
+        name, image = self.stored()
+        self.assertEqual(image.size, (20, 5))
+
+    def test_exif_applied_and_stripped(self):
+        """Поворот из EXIF применяется к пикселям, метаданные удаляются."""
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = 6
+        exif[EXIF_MAKE] = 'Camera with GPS'
+        self.upload(image_file('camera.jpg', exif=exif.tobytes()))
+        name, image = self.stored()
+        self.assertEqual(image.size, (30, 60))
+        self.assertEqual(dict(image.getexif()), {})
+
+    def test_oversized_file_rejected(self):
+        """Файл больше предела отклоняется, пост не создается."""
+        with mock.patch('posts.constants.UPLOAD_MAX_SIZE', 100):
+            response = self.upload(image_file('huge.jpg', size=(300, 300)))
+        self.assertFalse(Post.objects.filter(text='upload_text').exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 0 МБ.')
+
+    def test_decompression_bomb_rejected(self):
+        """Слишком много пикселей - отказ еще до распаковки."""
+        bomb = image_file('bomb.png', size=(50, 50), image_format='PNG')
+        with mock.patch('posts.constants.UPLOAD_MAX_PIXELS', 100), \
+                mock.patch('PIL.ImageFile.ImageFile.load') as load:
+            response = self.upload(bomb)
+        load.assert_not_called()
+        self.assertFalse(Post.objects.filter(text='upload_text').exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка слишком большая: 50×50.')
+
+    def test_truncated_image_rejected(self):
+        """Оборванный JPEG - ошибка формы, а не 500."""
+        output = BytesIO()
+        Image.linear_gradient('L').resize((300, 300)).save(output, 'JPEG')
+        data = output.getvalue()
+        truncated = SimpleUploadedFile(
+            'cut.jpg', data[:len(data) // 2], 'image/jpeg')
+        response = self.upload(truncated)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Post.objects.filter(text='upload_text').exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Файл картинки поврежден.')
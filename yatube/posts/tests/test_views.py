@@ -5,10 +5,12 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from http import HTTPStatus
-from ..constants import PUB_VALUE
+from ..constants import COMMENTS_PER_PAGE, PUB_VALUE
 from django import forms
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.models import Post, Group, Comment
@@ -227,3 +229,105 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(
                     response.context['page_obj']), TEMP_NUMB_TEST_TWO
                 )
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсоры ?after= и ?before= листают ленту без пропусков."""
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        self.assertEqual(len(first_page), PUB_VALUE)
+        self.assertIsNone(first_page.previous_cursor)
+
+        second_page = self.client.get(
+            url, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), TEMP_NUMB_TEST_TWO)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertEqual(
+            [post.pk for post in first_page] + [post.pk for post in
+                                                second_page],
+            list(Post.objects.order_by('-pub_date', '-id')
+                 .values_list('pk', flat=True))
+        )
+
+        back_page = self.client.get(
+            url, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in back_page],
+            [post.pk for post in first_page]
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор не ломает страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'after': 'not-a-cursor'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.context['page_obj']), PUB_VALUE)
+
+
+class CommentStreamTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='CommentAuthor')
+        cls.post = Post.objects.create(text='comment_post', author=cls.author)
+        cls.other_post = Post.objects.create(
+            text='other_comment_post', author=cls.author)
+        Comment.objects.create(
+            post=cls.other_post, author=cls.author, text='foreign_comment')
+
+    def add_comments(self, count):
+        start = self.post.comments.count()
+        for number in range(start, start + count):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.create_user(username=f'commenter{number}'),
+                text=f'comment_{number}'
+            )
+
+    def test_only_post_comments_shown(self):
+        """На странице поста только его комментарии."""
+        self.add_comments(1)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertContains(response, 'comment_0')
+        self.assertNotContains(response, 'foreign_comment')
+
+    def test_older_comments_loaded_by_cursor(self):
+        """Первая порция - новые комментарии, остальные догружаются."""
+        self.add_comments(COMMENTS_PER_PAGE + 5)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        first_page = response.context['comments']
+        self.assertEqual(len(first_page), COMMENTS_PER_PAGE)
+        self.assertEqual(
+            first_page[0].text, f'comment_{COMMENTS_PER_PAGE + 4}')
+
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'after': first_page.next_cursor}
+        )
+        older = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in older],
+            [f'comment_{number}' for number in range(4, -1, -1)]
+        )
+        self.assertIsNone(older.next_cursor)
+        self.assertNotContains(response, 'data-more-comments')
+
+    def test_comment_queries_do_not_grow(self):
+        """Число запросов страницы поста не зависит от числа комментариев."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.add_comments(1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        self.add_comments(COMMENTS_PER_PAGE)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(many), len(few))
+
+    def test_missing_post_comments(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 10 ** 6}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
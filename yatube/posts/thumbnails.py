@@ -0,0 +1,205 @@
+# Нарезка миниатюр заранее.
+# Без нее миниатюру режет первый читатель нового поста прямо в запросе.
+# Здесь все размеры из THUMBNAILS режутся в пуле процессов сразу после
+# сохранения картинки, запрос их не ждет.
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from . import constants
+from .single_flight import single_flight
+
+THUMBNAIL_KEY = 'thumbnail_url:{}'
+
+logger = logging.getLogger(__name__)
+
+# процессы пула не форкаются от процесса с потоками (очередь записи,
+# потоки сервера): блокировки, взятые другими потоками, остались бы
+# в дочернем процессе взятыми навсегда
+START_METHOD = (
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+    else 'spawn'
+)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def init_worker():
+    # соединения с БД, унаследованные от родителя при fork, не годятся
+    connections.close_all()
+
+
+def executor():
+    # пул свой у каждого процесса: после fork он не работает
+    pid = os.getpid()
+    with _executors_lock:
+        if pid not in _executors:
+            _executors[pid] = ProcessPoolExecutor(
+                max_workers=constants.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context(START_METHOD),
+                # новый процесс начинается без Django, а этот модуль
+                # без него не импортируется
+                initializer=django.setup)
+        return _executors[pid]
+
+
+def drop_executor(pool):
+    """Забывает сломанный пул: следующая нарезка запустит новый."""
+    with _executors_lock:
+        if _executors.get(os.getpid()) is pool:
+            del _executors[os.getpid()]
+    pool.shutdown(wait=False)
+
+
+def pool_available():
+    # THUMBNAIL_WORKERS = 0 - резать сразу, в том же процессе
+    return constants.THUMBNAIL_WORKERS > 0
+
+
+def log_failure(future):
+    # исключение из процесса пула иначе теряется вместе с Future
+    if not future.cancelled() and future.exception() is not None:
+        logger.error('Не удалось нарезать миниатюры',
+                     exc_info=future.exception())
+
+
+def generate(name, force=False):
+    """Режет все миниатюры картинки; `force` - заново, даже если есть."""
+    if force:
+        default.kvstore.delete_thumbnails(ImageFile(name))
+    for geometry, options in constants.THUMBNAILS.values():
+        get_thumbnail(name, geometry, **options)
+    return name
+
+
+def schedule(name):
+    """Ставит нарезку миниатюр в очередь после коммита транзакции."""
+    def submit():
+        if not pool_available():
+            generate(name)
+            return
+        pool = executor()
+        try:
+            future = pool.submit(generate, name)
+        except (BrokenProcessPool, RuntimeError):
+            # процесс пула умер или пул остановлен - иначе он отказывал бы
+            # каждой следующей нарезке
+            logger.exception('Пул нарезки миниатюр сломан, запускаем новый')
+            drop_executor(pool)
+            generate(name)
+            return
+        future.add_done_callback(log_failure)
+    transaction.on_commit(submit)
+
+
+def thumbnail_key(name, geometry, **options):
+    raw = '|'.join([name, geometry, *map(str, sorted(options.items()))])
+    return THUMBNAIL_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+@single_flight(constants.THUMBNAIL_CACHE_TTL, thumbnail_key)
+def thumbnail_url(name, geometry, **options):
+    # обычно миниатюра уже нарезана заранее, иначе ее режет один запрос,
+    # а не все одновременно
+    return get_thumbnail(name, geometry, **options).url
+
+
+def thumbnail_name(name, geometry, options):
+    """
+    Имя файла миниатюры - так же, как его считает sorl в get_thumbnail,
+    но без обращения к хранилищу и KV-store.
+    """
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(source, geometry, options)
+
+
+def variants(image):
+    """
+    Миниатюры адаптивной картинки `image` из RESPONSIVE_IMAGES:
+    [(имя в THUMBNAILS, формат, ширина, высота)] от узких к широким.
+    """
+    widths, ratio, options = constants.RESPONSIVE_IMAGES[image]
+    return [
+        (f'{image}-{width}-{image_format.lower()}', image_format,
+         width, round(width * ratio))
+        for image_format in constants.IMAGE_FORMATS
+        for width in widths
+    ]
+
+
+def resolve_many(names, sizes):
+    """
+    Уже нарезанные миниатюры картинок `names` всех размеров `sizes`:
+    {(имя картинки, размер): ImageFile}. Все ключи читаются одним
+    get_many из кэша sorl и одним IN-запросом к его таблице вместо
+    отдельного запроса на каждую миниатюру.
+    """
+    kvstore = default.kvstore
+    if not names or not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {}
+    keys = {}
+    for size in sizes:
+        geometry, options = constants.THUMBNAILS[size]
+        for name in names:
+            thumbnail = ImageFile(
+                thumbnail_name(name, geometry, options), default.storage)
+            keys[add_prefix(thumbnail.key)] = (name, size)
+    found = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        from_db = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                'key', 'value'))
+        kvstore.cache.set_many(
+            from_db, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(from_db)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in found.items()
+        # пустое значение - sorl уже искал и не нашел
+        if value != cached_db_kvstore.EMPTY_VALUE
+    }
+
+
+def prefetch(posts, sizes):
+    """
+    Кладет в `post.thumbnails[size]` адреса миниатюр всех размеров для
+    каждого поста страницы; недостающие миниатюры режутся по одной.
+    """
+    posts = [post for post in posts if post.image]
+    resolved = resolve_many({post.image.name for post in posts}, sizes)
+    for post in posts:
+        post.thumbnails = getattr(post, 'thumbnails', {})
+        for size in sizes:
+            thumbnail = resolved.get((post.image.name, size))
+            if thumbnail is not None:
+                post.thumbnails[size] = thumbnail.url
+            else:
+                geometry, options = constants.THUMBNAILS[size]
+                post.thumbnails[size] = thumbnail_url(
+                    post.image.name, geometry, **options)
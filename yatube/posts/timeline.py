@@ -0,0 +1,116 @@
+# Лента подписок, собранная заранее (fan-out on write)
+from django.db.models import F, Q
+
+from .constants import FANOUT_LIMIT, TIMELINE_BACKFILL
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+
+def fan_out(post):
+    """Раскладывает пост по лентам подписчиков автора."""
+    # популярность решает счетчик подписчиков, как в follow_feed:
+    # посты популярного автора подмешиваются при чтении, и в готовой
+    # ленте их нет ни у кого
+    followers = Follow.objects.filter(author_id=post.author_id).filter(
+        Q(author__stats__isnull=True)
+        | Q(author__stats__followers_count__lte=FANOUT_LIMIT)
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        ignore_conflicts=True
+    )
+
+
+def refresh(post):
+    """После правки поста раскладываем его заново."""
+    TimelineEntry.objects.filter(post=post).delete()
+    fan_out(post)
+
+
+def backfill(follow):
+    """Добавляет в ленту последние посты автора при подписке."""
+    if AuthorStats.objects.filter(
+        pk=follow.author_id, followers_count__gt=FANOUT_LIMIT
+    ).exists():
+        return
+    posts = (
+        Post.objects.filter(author_id=follow.author_id)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:TIMELINE_BACKFILL]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=follow.user_id, post_id=post_id, pub_date=pub_date
+            )
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True
+    )
+
+
+def demote(author_id):
+    """
+    Автор перестал быть популярным после отписки: посты, которые он
+    публиковал популярным и которых поэтому нет в готовой ленте,
+    раскладываются по лентам подписчиков.
+    """
+    if not AuthorStats.objects.filter(
+        pk=author_id, followers_count=FANOUT_LIMIT
+    ).exists():
+        return
+    posts = list(
+        Post.objects.filter(
+            author_id=author_id, timeline_entries__isnull=True
+        ).values_list('id', 'pub_date')
+    )
+    if not posts:
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id in Follow.objects.filter(
+                author_id=author_id).values_list('user_id', flat=True)
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True
+    )
+
+
+def remove(follow):
+    """Убирает посты автора из ленты при отписке."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+def celebrities_followed_by(user):
+    """Популярные авторы из подписок, которых нет в готовой ленте."""
+    return list(
+        AuthorStats.objects.filter(
+            user__following__user=user, followers_count__gt=FANOUT_LIMIT
+        ).values_list('user_id', flat=True)
+    )
+
+
+def follow_feed(user):
+    """Посты ленты подписок: готовая лента плюс популярные авторы."""
+    celebrities = celebrities_followed_by(user)
+    if celebrities:
+        return Post.objects.for_cards().filter(
+            Q(pk__in=TimelineEntry.objects.filter(
+                user=user).values('post_id'))
+            | Q(author_id__in=celebrities)
+        )
+    # обычный случай - один проход по индексу ленты (user, pub_date, post)
+    return (
+        Post.objects.for_cards()
+        .filter(timeline_entries__user=user)
+        .annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post=F('timeline_entries__post_id'),
+        )
+        .order_by('-feed_date', '-feed_post')
+    )
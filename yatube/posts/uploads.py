@@ -0,0 +1,97 @@
+# Прием картинок постов.
+# Загрузка пишется потоком во временный файл и обрывается на
+# UPLOAD_MAX_SIZE, так что большой файл не занимает ни память, ни диск.
+# Затем картинка один раз раскодируется: размеры проверяются еще по
+# заголовку, до распаковки пикселей, EXIF отбрасывается, а сама картинка
+# уменьшается до IMAGE_MAX_SIDE и сохраняется прогрессивным JPEG или,
+# если в ней есть прозрачность, WebP. В хранилище попадает уже
+# перекодированный файл, и миниатюры режутся из него.
+import os
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+from . import constants
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загрузку во временный файл, но не больше UPLOAD_MAX_SIZE:
+    остаток отбрасывается, а файл помечается `too_large` для формы.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > constants.UPLOAD_MAX_SIZE:
+            # тело запроса все равно дочитывается, но на диск не пишется
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.too_large = self.received > constants.UPLOAD_MAX_SIZE
+        return upload
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+
+
+def too_large_error():
+    return ValidationError(
+        'Файл больше %(size)d МБ.',
+        code='file_too_large',
+        params={'size': constants.UPLOAD_MAX_SIZE // 1024 // 1024},
+    )
+
+
+def reencode(upload):
+    """
+    Проверенная и перекодированная картинка из загруженного файла.
+    Ошибки - ValidationError для поля формы.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        width, height = image.size
+        # размер известен из заголовка: пиксели еще не распакованы
+        if width * height > constants.UPLOAD_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка слишком большая: %(width)d×%(height)d.',
+                code='too_many_pixels',
+                params={'width': width, 'height': height},
+            )
+        output, extension = _encode(image)
+    # заголовок цел, а данные нет: verify() поля формы такое пропускает,
+    # и ошибка всплывает только при распаковке пикселей
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise ValidationError(
+            'Файл картинки поврежден.', code='broken_image') from error
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    return ContentFile(output.getvalue(), name=name)
+
+
+def _encode(image):
+    side = constants.IMAGE_MAX_SIDE
+    # JPEG умеет раскодироваться сразу в уменьшенном масштабе
+    image.draft('RGB', (side, side))
+    # поворот из EXIF применяем к пикселям, сами метаданные не сохраняем
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side), Image.LANCZOS)
+    output = BytesIO()
+    if _has_alpha(image):
+        image.convert('RGBA').save(
+            output, 'WEBP', quality=constants.IMAGE_QUALITY, method=4)
+        return output, '.webp'
+    image.convert('RGB').save(
+        output, 'JPEG', quality=constants.IMAGE_QUALITY,
+        optimize=True, progressive=True)
+    return output, '.jpg'
@@ -1,59 +1,106 @@
-
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 from django.shortcuts import redirect, render, get_object_or_404
-from django.core.paginator import Paginator
 from .forms import PostForm, CommentForm
 from django.urls import reverse_lazy
-from .models import Post, Group, User, Comment, Follow
-from .constants import PUB_VALUE
+from .models import AuthorStats, Post, Comment, Follow, Group
+from .constants import COMMENTS_PER_PAGE, PUB_VALUE
+from .paginator import KeysetPaginator
+from . import conditional, thumbnails
+from .feed_cache import feed_version, page_tags
+from .feed_counts import feed_count
+from .timeline import follow_feed
+from .lookups import get_author_or_404, get_group_or_404
+from .search import search_posts
+from core.writes import write
 
 # cache для разработкы
 # from django.views.decorators.cache import cache_page
 
 
-def page_list(request, post_list):
+def page_list(request, post_list, count=None):
     # Показывать по 10 записей на странице.
-    paginator = Paginator(post_list, PUB_VALUE)
+    # count - откуда взять число постов для ?page=N вместо COUNT(*)
+    paginator = KeysetPaginator(post_list, PUB_VALUE, count=count)
 
     # Из URL извлекаем номер запрошенной страницы - это значение параметра page
     page_number = request.GET.get('page')
+    if page_number is not None:
+        # Старые ссылки ?page=N продолжают работать через OFFSET
+        return paginator.get_page(page_number)
+
+    # Иначе страница выбирается по курсору ?after= / ?before=
+    return paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
 
-    # Получаем набор записей для страницы с запрошенным номером
-    return paginator.get_page(page_number)
+def comment_page(post_id, after=None):
+    # новые комментарии сверху, более ранние догружаются по курсору;
+    # каждая порция - один проход по индексу (post, created)
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    paginator = KeysetPaginator(
+        comments, COMMENTS_PER_PAGE, ordering=('-created', '-id'))
+    return paginator.get_cursor_page(after=after)
+
+
+def comment_tags(post_id, comments):
+    # комментарии меняют версию поста, а имена их авторов - версии авторов
+    return {f'post:{post_id}'} | {
+        f'author:{comment.author_id}' for comment in comments
+    }
 
 
 # @cache_page(timeout=20, key_prefix='index_page')
+@conditional.feed_condition(conditional.index_scopes)
 def index(request):
     # в переменную posts будет сохранена выборка из 10 объектов модели Post,
     # отсортированных по полю pub_date по убыванию
-    post_list = Post.objects.select_related()
-    page_obj = page_list(request, post_list)
+    post_list = Post.objects.for_cards()
+    page_obj = page_list(
+        request, post_list, count=lambda: feed_count('index', post_list))
     # Отдаем в словаре контекста
     context = {
         'page_obj': page_obj,
+        # версия ленты входит в ключ кэша фрагмента
+        'feed_version': feed_version('index'),
     }
-    return render(request, 'posts/index.html', context)
+    response = render(request, 'posts/index.html', context)
+    # теги для кэша страниц анонимов, см. posts/middleware.py
+    response.cache_tags = page_tags(page_obj, 'index')
+    return response
 
 
+@conditional.feed_condition(conditional.group_scopes)
 def group_list(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.group_list.all()
+    group = get_group_or_404(slug)
+    post_list = group.group_list.for_cards()
 
-    page_obj = page_list(request, post_list)
+    page_obj = page_list(
+        request, post_list,
+        count=lambda: feed_count(f'group:{group.pk}', post_list),
+    )
 
     context = {
         'text': slug,
         'group': group,
         'page_obj': page_obj,
+        'feed_version': feed_version(f'group:{group.pk}'),
     }
-    return render(request, 'posts/group_list.html', context)
+    response = render(request, 'posts/group_list.html', context)
+    response.cache_tags = page_tags(page_obj, f'group:{group.pk}')
+    return response
 
 
+@conditional.feed_condition(conditional.profile_scopes)
 def profile(request, username):
 
     # Здесь код запроса к модели и создание словаря контекста
-    author = get_object_or_404(User, username=username)
-    posts_author = Post.objects.filter(author=author)
+    # автор из кэша, счетчики из AuthorStats - они меняются часто
+    author = get_author_or_404(username)
+    posts_author = Post.objects.for_cards().filter(author=author)
     is_my_profile = False
     following = False
     if request.user.is_authenticated:
@@ -64,28 +111,102 @@ def profile(request, username):
         if Follow.objects.filter(author=author, user=request.user).exists():
             following = True
 
-    page_obj = page_list(request, posts_author)
+    # у автора число постов уже есть в счетчике
+    page_obj = page_list(
+        request, posts_author,
+        count=lambda: AuthorStats.objects.filter(user=author).values_list(
+            'posts_count', flat=True).first() or 0,
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
         'following': following,
         'is_my_profile': is_my_profile,
+        'feed_version': feed_version(f'author:{author.pk}'),
     }
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    response.cache_tags = page_tags(page_obj, f'author:{author.pk}')
+    return response
 
 
+@conditional.feed_condition(conditional.post_scopes)
 def post_detail(request, post_id):
     # Здесь код запроса к модели и создание словаря контекста
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        # полный текст нужен - без for_cards(), там он отложен
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
     form_comment = CommentForm()
-    comments = Comment.objects.filter(post__comments__author=post_id)
+    comments = comment_page(post.pk)
+    try:
+        # счетчик хранится в AuthorStats, без COUNT(*)
+        count_posts = post.author.stats.posts_count
+    except AuthorStats.DoesNotExist:
+        # строки счетчиков нет (loaddata, bulk_create) до первой записи
+        # автора или manage.py recount
+        count_posts = post.author.posts.count()
     context = {
         'post': post,
-        'count_posts': post.author.posts.count(),
+        'count_posts': count_posts,
         'comments': comments,
         'form': form_comment,
     }
-    return render(request, 'posts/post_detail.html', context)
+    response = render(request, 'posts/post_detail.html', context)
+    response.cache_tags = page_tags([post]) | comment_tags(post.pk, comments)
+    return response
+
+
+@conditional.feed_condition(conditional.post_scopes)
+def post_comments(request, post_id):
+    # порция более ранних комментариев - HTML-фрагмент для догрузки
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404('Post not found')
+    comments = comment_page(post_id, after=request.GET.get('after'))
+    response = render(request, 'posts/includes/comments.html', {
+        'post_id': post_id,
+        'comments': comments,
+    })
+    response.cache_tags = comment_tags(post_id, comments)
+    return response
+
+
+def search(request):
+    # полнотекстовый поиск по постам, фильтры по группе и автору
+    query = request.GET.get('q', '').strip()
+    group_slug = request.GET.get('group', '')
+    username = request.GET.get('author', '').strip()
+    group = get_group_or_404(group_slug) if group_slug else None
+    author = get_author_or_404(username) if username else None
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page_number = 1
+    # лишний пост показывает, есть ли следующая страница
+    results = search_posts(
+        query,
+        offset=(page_number - 1) * PUB_VALUE,
+        limit=PUB_VALUE + 1,
+        group_id=group and group.pk,
+        author_id=author and author.pk,
+    )
+
+    def page_url(number):
+        params = request.GET.copy()
+        params['page'] = number
+        return '?' + params.urlencode()
+
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.order_by('title'),
+        'results': results[:PUB_VALUE],
+        'previous_url': page_url(page_number - 1) if page_number > 1 else None,
+        'next_url': (
+            page_url(page_number + 1) if len(results) > PUB_VALUE else None
+        ),
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
@@ -98,9 +219,15 @@ def post_create(request):
         if form.is_valid():
             new_form = form.save(commit=False)
             new_form.author = request.user
-            new_form.save()
+
+            def save():
+                # пост и счетчики автора сохраняются вместе
+                new_form.save()
+                if new_form.image:
+                    thumbnails.schedule(new_form.image.name)
+            # через очередь записи, см. core/writes.py
+            write(save)
             return redirect('posts:profile', request.user)
-        form = PostForm()
     context = {'form': form,
                }
     return render(request, 'posts/create_post.html', context)
@@ -109,7 +236,8 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     edited_post = get_object_or_404(Post, id=post_id)
-    if request.user == edited_post.author:
+    # сравниваем по id, не загружая автора
+    if edited_post.author_id == request.user.pk:
         if request.method == 'POST':
             form = PostForm(
                 request.POST or None,
@@ -121,7 +249,11 @@ def post_edit(request, post_id):
                 'is_edit': True,
             }
             if form.is_valid():
-                form.save()
+                def save():
+                    form.save()
+                    if 'image' in form.changed_data and edited_post.image:
+                        thumbnails.schedule(edited_post.image.name)
+                write(save)
                 return redirect(
                     reverse_lazy(
                         'posts:post_detail',
@@ -151,18 +283,23 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@conditional.feed_condition(conditional.follow_scopes)
 def follow_index(request):
     # здесь выводим посты авторов, на которых подписан текущий пользователь.
-    post_list = Post.objects.filter(author__following__user=request.user)
+    # лента собрана заранее, см. posts/timeline.py
+    post_list = follow_feed(request.user)
     page_obj = page_list(request, post_list)
     # Отдаем в словаре контекста
     context = {
         'page_obj': page_obj,
+        # любая запись поста меняет версию index, подписки - свою
+        'feed_version': feed_version(
+            'index', f'follow:{request.user.pk}'),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -170,24 +307,27 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     # подписаться на автора
-    author = get_object_or_404(User, username=username)
+    author = get_author_or_404(username)
     # это на всяки случаи если захочет подписаться на себя каким то образом
     # и проверяем подписан ли пользователь
-    if Follow.objects.filter(author=author, user=request.user).exists() or (
-        request.user.username == username
-    ):
+    if request.user.username == username:
         return redirect('posts:profile', username=username)
-    follow_record = Follow(user=request.user, author=author)
-    follow_record.save()
+
+    def follow():
+        # проверка и запись в одной транзакции записи: двойной клик
+        # не упрется в unique_following
+        if not Follow.objects.filter(
+                author=author, user=request.user).exists():
+            Follow.objects.create(user=request.user, author=author)
+    write(follow)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(requst, username):
     # отписаться от автора
-    author = get_object_or_404(User, username=username)
+    author = get_author_or_404(username)
     unfollow_db = Follow.objects.filter(author=author, user=requst.user)
-    # проверяем подписан ли пользователь
-    if unfollow_db.exists():
-        unfollow_db.delete()
+    # если подписки нет, delete() ограничится одним SELECT
+    write(unfollow_db.delete)
     return redirect('posts:profile', username=username)
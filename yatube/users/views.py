@@ -4,6 +4,9 @@ from django.views.generic import CreateView
 # Функция reverse_lazy позволяет получить URL по параметрам функции path()
 # Берём, тоже пригодится
 from django.urls import reverse_lazy
+from django.http import HttpResponseRedirect
+
+from core.writes import write
 
 # Импортируем класс формы, чтобы сослаться на неё во view-классе
 from .forms import CreationForm
@@ -14,3 +17,10 @@ class SignUp(CreateView):
     # После успешной регистрации перенаправляем пользователя на главную.
     success_url = reverse_lazy('posts:index')
     template_name = 'users/signup.html'
+
+    def form_valid(self, form):
+        # пароль хешируется здесь, в потоке запроса: в очередь записи
+        # (core/writes.py) уходит только сохранение пользователя
+        self.object = form.save(commit=False)
+        write(self.object.save)
+        return HttpResponseRedirect(self.get_success_url())
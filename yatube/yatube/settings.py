@@ -26,6 +26,13 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # Media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# загрузки называются хешем содержимого, см. posts/storage.py;
+# миниатюрам sorl нужны их собственные имена - им обычное хранилище
+DEFAULT_FILE_STORAGE = 'posts.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+# загрузки пишутся потоком во временный файл с пределом размера,
+# см. posts/uploads.py
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
 
 # Caches для разработкы
 CACHES = {
@@ -33,6 +40,14 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+# Под несколькими воркерами кэш должен быть общим для всех процессов,
+# иначе сброс версий ленты не доходит до соседних воркеров
+if os.environ.get('YATUBE_SHARED_CACHE'):
+    CACHES['default'] = {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.environ['YATUBE_SHARED_CACHE'],
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
 
 
 # Quick-start development settings - unsuitable for production
@@ -70,6 +85,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # кэш страниц для анонимов отвечает раньше сессий и авторизации
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -108,8 +125,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # соединение переживает запрос и проверяется перед следующим,
+        # см. core/db.py
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 600)),
     }
 }
+# Прагмы для каждого нового соединения SQLite, см. core/db.py:
+# WAL - читатели не блокируются писателем; NORMAL - fsync только на
+# контрольных точках WAL (после сбоя питания теряются последние
+# транзакции, но база остается целой); mmap и кэш страниц по 256 и 64 МБ;
+# одновременная запись ждет до 20 секунд вместо «database is locked»
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 20 * 1000,
+    'temp_store': 'MEMORY',
+}
+# Очередь записи, см. core/writes.py: записи, пришедшие в пределах WINDOW
+# секунд, до MAX_BATCH штук, коммитятся одной транзакцией; занятая база -
+# до RETRIES повторов с паузой до BACKOFF * 2^попытка (не больше
+# BACKOFF_MAX); метрики - по SAMPLES последним записям, в лог раз в
+# REPORT_EVERY секунд
+WRITE_QUEUE = {
+    'ENABLED': os.environ.get('YATUBE_WRITE_QUEUE', '1') == '1',
+    'WINDOW': 0.002,
+    'MAX_BATCH': 64,
+    'RETRIES': 8,
+    'BACKOFF': 0.005,
+    'BACKOFF_MAX': 0.5,
+    'SAMPLES': 1000,
+    'REPORT_EVERY': 60,
+}
 
 
 # Password validation